@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+# Check that the ways of linking a synthetic program (see omfgen.py) give
+# the same bytes: the plain link, the parallel and cached parses, the other
+# verify modes, the indexed library, the incremental relink, the garbage
+# collected link and the direct binary image, with low and high byte
+# references as well as 16-bit ones.  Libraries written again from
+# their members must be identical to the originals.  Then check the
+# output itself: fixed programs against the hashes of their link and
+# image, a few low and high byte references against their bytes, and a
+# program past 64K against its error.  Exits with status 1 when any of
+# them differs.
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import omf80
+import omfgen
+
+PLM80_LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                            'tools', 'plm80', 'plm80.lib')
+PLM80_LIB_SHA256 = '42b3b897168a8c2d88ebc54687ee61837e92b96bcec1d5d3bc41d28e33281e22'
+
+# programs of omfgen.py with the sha256 of their link and of their image
+# at 0x180 with a stack of 0x40; those of the first were made by the
+# original link.py and mkbin.py, which knew only 16-bit references, those
+# of the second by link.py and mkbin.py, and linkbin.py, which agree
+GOLDEN_PROGRAMS = [
+    ({'modules': 4, 'code_size': 3000, 'data_size': 300, 'relocations': 96,
+      'externals': 16, 'line_numbers': 64, 'publics': 16, 'library_modules': 16, 'seed': 1},
+     '52ef07af4a29dab1d21728475bce3772e89eddea2a79800c59152d5e6bedf34d',
+     'fad3421fee3b1f667e16d5c43a07da1f2d453900dd9b8a7957841c70a3b33c4e'),
+    ({'modules': 4, 'code_size': 3000, 'data_size': 300, 'relocations': 96,
+      'externals': 16, 'line_numbers': 64, 'publics': 16, 'byte_references': 16,
+      'library_modules': 16, 'seed': 1},
+     '000a2fb33946739f12812395a723dab5bde381585ea3f370628155c4b14a9c83',
+     'e4b2e1c7eb74d3217f293a302c8c944b2bfe7dd48304181eb189c3df20c5f5b1'),
+]
+
+failures = 0
+
+def check(name, result, expected):
+    global failures
+    if bytes(result) == bytes(expected):
+        print(f'ok      {name}')
+    else:
+        failures += 1
+        print(f'FAILED  {name}')
+
+def module_bin(module):
+    return omf80.records_to_bin(omf80.add_eof(omf80.module_to_records(module)))
+
+def image_bin(module, code_start, stack_size):
+    omf80.module_adjust(module, code_start=code_start, stack_size=stack_size)
+    return omf80.module_to_bin(module)
+
+def write_files(directory, files):
+    filenames = []
+    for filename, data in files:
+        path = os.path.join(directory, filename)
+        with open(path, 'wb') as file:
+            file.write(data)
+        filenames.append(path)
+    return filenames
+
+# the low byte of code_start makes the high byte references carry, where
+# adding the start to the address and to its high byte differ
+def run(directory, params, code_start=0x180, stack_size=0x40):
+    files = omfgen.make_program(**params)
+    filenames = write_files(directory, files)
+    reference = module_bin(omf80.link_files(filenames))
+
+    for filename, data in files:
+        if filename.endswith('.lib'):
+            check('library members', omf80.library_members_to_bin(
+                    omf80.read_library_members(data)), data)
+    if os.path.exists(PLM80_LIB):
+        with open(PLM80_LIB, 'rb') as file:
+            data = file.read()
+        check('plm80.lib members', hashlib.sha256(omf80.library_members_to_bin(
+                omf80.read_library_members(data))).digest(), bytes.fromhex(PLM80_LIB_SHA256))
+
+    check('jobs', module_bin(omf80.link_files(filenames, jobs=2)), reference)
+    for verify in (omf80.VERIFY_FAST, omf80.VERIFY_OFF):
+        check(f'verify {verify}', module_bin(omf80.link_files(filenames, verify=verify)), reference)
+    cache = omf80.ObjectCache(os.path.join(directory, 'cache'))
+    check('cache, first link', module_bin(omf80.link_files(filenames, cache=cache)), reference)
+    check('cache, second link', module_bin(omf80.link_files(filenames, cache=cache)), reference)
+
+    image = image_bin(omf80.link_files(filenames), code_start, stack_size)
+    check('link_to_bin', omf80.link_to_bin(omf80.load_objects(filenames),
+            code_start=code_start, stack_size=stack_size), image)
+
+    libraries = [filename for filename in filenames if filename.endswith('.lib')]
+    for filename in libraries:
+        omf80.update_library_index(filename)
+    check('library index', module_bin(omf80.link_files(filenames)), reference)
+    for filename in libraries:
+        os.remove(omf80.library_index_filename(filename))
+
+    # relink after changes of the second module: first its code and the
+    # offsets of its publics only, then its size
+    state_file = os.path.join(directory, 'out.lnk')
+    check('incremental, first link', module_bin(omf80.link_files(filenames, state_file=state_file)), reference)
+    check('incremental, no change', module_bin(omf80.link_files(filenames, state_file=state_file)), reference)
+    if params['modules'] > 1:
+        changes = [('code changed', dict(params, seed=params.get('seed', 0) + 100)),
+                   ('size changed', dict(params, code_size=params['code_size'] // 2))]
+        for name, changed_params in changes:
+            changed = omfgen.make_program(**changed_params)
+            write_files(directory, changed[1:2])
+            check(f'incremental, {name}', module_bin(omf80.link_files(filenames, state_file=state_file)),
+                    module_bin(omf80.link_files(filenames)))
+        write_files(directory, files)
+
+    # a module nothing refers to is left out
+    dead = omfgen.make_module('DEAD', code_size=256, data_size=0, stack_size=0,
+                    relocations=16, publics=2, line_numbers=0)
+    objects = [filename for filename in filenames if not filename.endswith('.lib')]
+    gc_filenames = objects + write_files(directory, [('dead.obj', omfgen.module_to_bin(dead))]) + libraries
+    check('gc', module_bin(omf80.link_files(gc_filenames, gc=True)), reference)
+    check('gc, link_to_bin', omf80.link_to_bin(omf80.load_objects(gc_filenames),
+            code_start=code_start, stack_size=stack_size, gc=True), image)
+
+# the output of function, an error, is message
+def check_error(name, function, message):
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            function()
+    except SystemExit:
+        pass
+    check(name, output.getvalue().encode(), f'error: {message}\n'.encode())
+
+def golden(directory):
+    for i, (params, link_sha256, image_sha256) in enumerate(GOLDEN_PROGRAMS):
+        filenames = write_files(directory, omfgen.make_program(**params))
+        check(f'golden program {i}, link', hashlib.sha256(module_bin(omf80.link_files(filenames))).digest(),
+                bytes.fromhex(link_sha256))
+        check(f'golden program {i}, image', hashlib.sha256(image_bin(omf80.link_files(filenames), 0x180, 0x40)).digest(),
+                bytes.fromhex(image_sha256))
+        for filename in filenames:
+            os.remove(filename)
+
+    # SECOND, after the 0x1f0 bytes of FIRST, refers to the low and the
+    # high byte of P at 0x1e8, and of its own code at 0x1f0 + 0x20
+    first = omfgen.make_module('FIRST', code_size=0x1f0, data_size=0, stack_size=16,
+                    relocations=0, publics=0, line_numbers=0, is_main=True)
+    first['public_declarations'][omf80.CODE_SEGMENT].add(0x1e8, 'P')
+    second = omfgen.make_module('SECOND', code_size=4, data_size=0, stack_size=0,
+                    relocations=0, publics=0, line_numbers=0)
+    second['external_names'] = ['P']
+    cdef = second['content_definitions'][0]
+    cdef['data'][:] = bytes([0x00, 0x00, 0x00, 0x20])
+    cdef.setdefault('external', {}).update({omf80.LOW_BYTE: [omf80.Symbol('P', 0)],
+                                            omf80.HIGH_BYTE: [omf80.Symbol('P', 1)]})
+    cdef.setdefault('internal', {}).update({(omf80.CODE_SEGMENT, omf80.HIGH_BYTE): [2],
+                                            (omf80.CODE_SEGMENT, omf80.LOW_BYTE): [3]})
+    filenames = write_files(directory, [('first.obj', omfgen.module_to_bin(first)),
+                                        ('second.obj', omfgen.module_to_bin(second))])
+    expected = bytes([0xe8, 0x01, 0x01, 0x10])
+    check('low and high bytes, link', image_bin(omf80.link_files(filenames), 0, 16)[0x1f0:0x1f4], expected)
+    check('low and high bytes, link_to_bin', omf80.link_to_bin(omf80.load_objects(filenames),
+            code_start=0, stack_size=16)[0x1f0:0x1f4], expected)
+
+    # two modules of 0x8800 bytes of code
+    filenames = write_files(directory, omfgen.make_program(modules=2, code_size=0x8800,
+                    data_size=0, relocations=64, externals=4, line_numbers=0,
+                    publics=4, library_modules=0))
+    message = 'link: code segment of 0x11000 bytes, past 0xffff'
+    check_error('past 64K, link', lambda: omf80.link_files(filenames), message)
+    check_error('past 64K, link_to_bin', lambda: omf80.link_to_bin(omf80.load_objects(filenames)), message)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=8, help="number of modules")
+    parser.add_argument("--code", type=int, default=2048, help="code bytes per module")
+    parser.add_argument("--data", type=int, default=256, help="data bytes per module")
+    parser.add_argument("--relocations", type=int, default=64, help="relocations per module")
+    parser.add_argument("--externals", type=int, default=16, help="external names per module")
+    parser.add_argument("--lines", type=int, default=64, help="line numbers per module")
+    parser.add_argument("--publics", type=int, default=16, help="public names per module")
+    parser.add_argument("--bytes", type=int, default=16, help="low and high byte references per module, of the relocations and of the externals each")
+    parser.add_argument("--library", type=int, default=32, help="modules in the library")
+    args = parser.parse_args()
+
+    params = {"modules": args.modules, "code_size": args.code, "data_size": args.data,
+              "relocations": args.relocations, "externals": args.externals,
+              "line_numbers": args.lines, "publics": args.publics,
+              "byte_references": args.bytes, "library_modules": args.library}
+    with tempfile.TemporaryDirectory() as directory:
+        run(directory, params)
+    with tempfile.TemporaryDirectory() as directory:
+        golden(directory)
+    if failures > 0:
+        print(f'{failures} failed')
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+# Synthetic OMF-80 modules and libraries for the benchmarks.  A program is
+# a main module and a number of other modules, each calling into the next
+# one and into a library; all the sizes are configurable.
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import omf80
+
+# bytes of content per content definition
+CHUNK_SIZE = 1024
+
+def public_name(module_name, index):
+    return f'{module_name}P{index}'
+
+def spread(rnd, count, length):
+    count = min(count, length)
+    return sorted(rnd.sample(range(length), count))
+
+def make_module(name, code_size=4096, data_size=1024, stack_size=16,
+                relocations=256, externals=(), publics=16, line_numbers=1024,
+                byte_references=0, is_main=False, seed=0):
+    rnd = random.Random(seed)
+    module = {'type': 'MODULE', 'name': name, 'is_main': is_main}
+    module['segments'] = {
+        omf80.CODE_SEGMENT: omf80.Segment(code_size, 3),
+        omf80.DATA_SEGMENT: omf80.Segment(data_size, 3),
+        omf80.STACK_SEGMENT: omf80.Segment(stack_size, 3),
+        omf80.MEMORY_SEGMENT: omf80.Segment(0, 3),
+    }
+    module['external_names'] = list(externals)
+
+    code_publics = omf80.SymbolTable()
+    for i, offset in enumerate(spread(rnd, publics, code_size)):
+        code_publics.add(offset, public_name(name, i))
+    module['public_declarations'] = {omf80.CODE_SEGMENT: code_publics}
+
+    local_symbols = omf80.SymbolTable()
+    for i, offset in enumerate(spread(rnd, publics * 4, code_size)):
+        local_symbols.add(offset, f'{name}L{i}')
+    lines = omf80.LineTable()
+    for i, offset in enumerate(spread(rnd, line_numbers, code_size)):
+        lines.add(offset, i + 1)
+    debug_info = {'ancestor_name': name,
+                  'local_symbols': {omf80.CODE_SEGMENT: local_symbols}}
+    if len(lines) > 0:
+        debug_info['line_numbers'] = {omf80.CODE_SEGMENT: lines}
+    module['debug_info'] = [debug_info]
+
+    # 16-bit references on even offsets: relocations into the code and the
+    # data segments, then the external references; the first byte_references
+    # of each are to the low or the high byte of the address instead, in
+    # the first byte of their word
+    words = code_size // 2
+    references = rnd.sample(range(words), min(words, relocations + len(externals)))
+    cdefs = []
+    for start in range(0, code_size, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, code_size)
+        data = bytearray(rnd.getrandbits(8) for _ in range(end - start))
+        cdefs.append(omf80.ContentDefinition(omf80.CODE_SEGMENT, start, data))
+    for i, word in enumerate(references):
+        offset = word * 2
+        cdef = cdefs[offset // CHUNK_SIZE]
+        index = i if i < relocations else i - relocations
+        if index >= byte_references:
+            lo_hi_both = omf80.BOTH_BYTES
+        else:
+            lo_hi_both = omf80.LOW_BYTE if index // 2 % 2 == 0 else omf80.HIGH_BYTE
+        if i < relocations:
+            seg_id = omf80.CODE_SEGMENT if i % 2 == 0 else omf80.DATA_SEGMENT
+            size = code_size if seg_id == omf80.CODE_SEGMENT else data_size
+            value = rnd.randrange(max(size, 1))
+            if lo_hi_both == omf80.HIGH_BYTE:
+                cdef['data'][offset - cdef['offset']] = value >> 8
+            elif lo_hi_both == omf80.LOW_BYTE:
+                cdef['data'][offset - cdef['offset']] = value & 0xff
+            else:
+                omf80.U16.pack_into(cdef['data'], offset - cdef['offset'], value)
+            internal = cdef.setdefault('internal', {})
+            internal.setdefault((seg_id, lo_hi_both), []).append(offset)
+        else:
+            omf80.U16.pack_into(cdef['data'], offset - cdef['offset'], 0)
+            external = cdef.setdefault('external', {})
+            external.setdefault(lo_hi_both, []).append(
+                omf80.Symbol(externals[index], offset))
+    for cdef in cdefs:
+        for offsets in cdef.get('internal', {}).values():
+            offsets.sort()
+        for exts in cdef.get('external', {}).values():
+            exts.sort(key = lambda x : x['offset'])
+    module['content_definitions'] = cdefs
+    return module
+
+def module_to_bin(module):
+    return omf80.records_to_bin(omf80.add_eof(omf80.module_to_records(module)))
+
+# the objects of a program: a list of (file name, binary data)
+def make_program(modules=8, code_size=4096, data_size=1024, relocations=256,
+                 externals=16, line_numbers=1024, publics=16, byte_references=0,
+                 library_modules=64, library_code_size=256, seed=0):
+    names = [f'M{i}' for i in range(modules)]
+    library_names = [f'LIB{i}' for i in range(library_modules)]
+    files = []
+    for i, name in enumerate(names):
+        # calls into the next module, and into the library
+        callee = names[(i + 1) % modules]
+        extern_names = []
+        for j in range(externals):
+            if j % 2 == 0 and modules > 1:
+                extern_names.append(public_name(callee, j % publics))
+            elif library_modules > 0:
+                extern_names.append(public_name(library_names[(i * externals + j) % library_modules], 0))
+        extern_names = list(dict.fromkeys(extern_names))
+        module = make_module(name, code_size=code_size, data_size=data_size,
+                    relocations=relocations, externals=extern_names,
+                    publics=publics, line_numbers=line_numbers,
+                    byte_references=byte_references, is_main=(i == 0), seed=seed + i)
+        files.append((f'{name.lower()}.obj', module_to_bin(module)))
+    if library_modules > 0:
+        library = [make_module(name, code_size=library_code_size, data_size=0,
+                        stack_size=0, relocations=library_code_size // 16,
+                        publics=2, line_numbers=0, byte_references=byte_references,
+                        seed=seed + 1000 + i)
+                   for i, name in enumerate(library_names)]
+        files.append(('synth.lib', omf80.library_to_bin({'modules': library})))
+    return files
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--out", default=".", help="output directory")
+    parser.add_argument("--modules", type=int, default=8, help="number of modules")
+    parser.add_argument("--code", type=int, default=4096, help="code bytes per module")
+    parser.add_argument("--data", type=int, default=1024, help="data bytes per module")
+    parser.add_argument("--relocations", type=int, default=256, help="relocations per module")
+    parser.add_argument("--externals", type=int, default=16, help="external names per module")
+    parser.add_argument("--lines", type=int, default=1024, help="line numbers per module")
+    parser.add_argument("--publics", type=int, default=16, help="public names per module")
+    parser.add_argument("--bytes", type=int, default=0, help="low and high byte references per module, of the relocations and of the externals each")
+    parser.add_argument("--library", type=int, default=64, help="modules in the library")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    files = make_program(modules=args.modules, code_size=args.code,
+                data_size=args.data, relocations=args.relocations,
+                externals=args.externals, line_numbers=args.lines,
+                publics=args.publics, byte_references=args.bytes,
+                library_modules=args.library,
+                seed=args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    for filename, data in files:
+        with open(os.path.join(args.out, filename), 'wb') as file:
+            file.write(data)
+        print(f'{filename}: {len(data)} bytes')
+
+if __name__ == "__main__":
+    main()
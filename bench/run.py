@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Time the parse, link and binary emission steps on a synthetic program
+# (see omfgen.py) and append the results to a JSON history, comparing them
+# with the previous run made with the same parameters.
+
+import argparse
+import datetime
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import omf80
+import omfgen
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.json')
+
+# best time of repeat calls of fn(setup()), setup is not timed
+def best_time(fn, setup, repeat):
+    best = None
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        fn(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(files, repeat, code_start=0x100, stack_size=0x40):
+    objects = [data for filename, data in files if not filename.endswith('.lib')]
+    libraries = [data for filename, data in files if filename.endswith('.lib')]
+    records = [omf80.read_omf80(data)[:-1] for data in objects]
+    modules = [omf80.records_to_module(recs) for recs in records]
+    linked = pickle.dumps(omf80.link(modules + [omf80.read_object(data) for data in libraries]))
+    adjusted = pickle.loads(linked)
+    omf80.module_adjust(adjusted, code_start=code_start, stack_size=stack_size)
+
+    results = {}
+    results['read_omf80'] = best_time(
+        lambda _: [omf80.read_omf80(data) for data in objects + libraries],
+        lambda: None, repeat)
+    results['records_to_module'] = best_time(
+        lambda _: [omf80.records_to_module(recs) for recs in records],
+        lambda: None, repeat)
+    # libraries are read again each time, they keep the modules they decode
+    results['link'] = best_time(
+        lambda lst: omf80.link(lst),
+        lambda: modules + [omf80.read_object(data) for data in libraries], repeat)
+    results['module_adjust'] = best_time(
+        lambda module: omf80.module_adjust(module, code_start=code_start, stack_size=stack_size),
+        lambda: pickle.loads(linked), repeat)
+    results['module_to_bin'] = best_time(
+        lambda module: omf80.module_to_bin(module),
+        lambda: adjusted, repeat)
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                    capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as file:
+        return json.load(file)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=8, help="number of modules")
+    parser.add_argument("--code", type=int, default=4096, help="code bytes per module")
+    parser.add_argument("--data", type=int, default=1024, help="data bytes per module")
+    parser.add_argument("--relocations", type=int, default=256, help="relocations per module")
+    parser.add_argument("--externals", type=int, default=16, help="external names per module")
+    parser.add_argument("--lines", type=int, default=1024, help="line numbers per module")
+    parser.add_argument("--publics", type=int, default=16, help="public names per module")
+    parser.add_argument("--library", type=int, default=64, help="modules in the library")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per step, the best is kept")
+    parser.add_argument("--history", default=HISTORY, help="JSON file of the previous results")
+    parser.add_argument("--no-save", action="store_true", help="do not add the results to the history")
+    args = parser.parse_args()
+
+    params = {"modules": args.modules, "code": args.code, "data": args.data,
+              "relocations": args.relocations, "externals": args.externals,
+              "lines": args.lines, "publics": args.publics, "library": args.library}
+    files = omfgen.make_program(modules=args.modules, code_size=args.code,
+                data_size=args.data, relocations=args.relocations,
+                externals=args.externals, line_numbers=args.lines,
+                publics=args.publics, library_modules=args.library)
+    results = run(files, args.repeat)
+
+    history = load_history(args.history)
+    previous = None
+    for entry in reversed(history):
+        if entry["params"] == params:
+            previous = entry
+            break
+    for step, elapsed in results.items():
+        line = f'{step:20s} {elapsed * 1000:10.2f} ms'
+        if previous is not None and previous["results"].get(step):
+            change = (elapsed / previous["results"][step] - 1) * 100
+            line += f'  {change:+7.1f}% vs {previous["revision"]}'
+        print(line)
+
+    if not args.no_save:
+        history.append({"date": datetime.datetime.now().isoformat(timespec='seconds'),
+                        "revision": git_revision(), "python": sys.version.split()[0],
+                        "params": params, "results": results})
+        with open(args.history, 'w') as file:
+            json.dump(history, file, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# Time records_to_module on modules split into a growing number of PUBLIC
+# DECLARATION, LOCAL SYMBOLS, LINE NUMBERS and EXTERNAL REFERENCES records.
+# The cost per record must stay flat as the record count doubles.
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import omf80
+
+def make_records(count):
+    segments = {omf80.CODE_SEGMENT: omf80.Segment(0xffff, 3)}
+    records = [omf80.ModuleHeaderRecord(name="SCALING", segments=segments)]
+    records.append(omf80.ExternalNamesRecord(names=["EXT"]))
+    records.append(omf80.ContentRecord(seg_id=omf80.CODE_SEGMENT, offset=0,
+                        dat=bytearray(0xffff)))
+    for i in range(count):
+        # offsets go down, so that every record is out of order
+        offset = (count - i) % 0xfffe
+        records.append(omf80.PublicDeclarationRecord(seg_id=omf80.CODE_SEGMENT,
+                        public_names=[omf80.Symbol(f"P{i}", offset)]))
+        records.append(omf80.LocalSymbolsRecord(seg_id=omf80.CODE_SEGMENT,
+                        symbols=[omf80.Symbol(f"L{i}", offset)]))
+        records.append(omf80.LineNumbersRecord(seg_id=omf80.CODE_SEGMENT,
+                        line_numbers=[omf80.LineNumber(offset, i)]))
+        records.append(omf80.ExternalReferencesRecord(lo_hi_both=3,
+                        references=[omf80.ExternalReference(0, offset)]))
+    records.append(omf80.ModuleEndRecord(mod_typ=0, seg_id=omf80.CODE_SEGMENT,
+                        offset=0, optional_info=[]))
+    return records
+
+def time_records_to_module(records, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        omf80.records_to_module(records)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", type=int, default=1000,
+                            help="records of each type in the first run")
+    parser.add_argument("--steps", type=int, default=6,
+                            help="number of runs, doubling the record count")
+    parser.add_argument("--repeat", type=int, default=3,
+                            help="runs per record count, the best is kept")
+    args = parser.parse_args()
+
+    count = args.start
+    for _ in range(args.steps):
+        records = make_records(count)
+        elapsed = time_records_to_module(records, args.repeat)
+        per_record = elapsed / len(records) * 1e6
+        print(f'{len(records):8d} records  {elapsed:8.3f} s  {per_record:6.2f} us/record')
+        count *= 2
+
+if __name__ == "__main__":
+    main()
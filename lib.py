@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+
+import omf80
+
+def read_members(filename):
+    with open(filename, 'rb') as file:
+        data = file.read()
+    if len(data) == 0:
+        omf80.error(f'empty file {filename}')
+    return omf80.read_library_members(data)
+
+def write_library(filename, members):
+    with open(filename, 'wb') as file:
+        file.write(omf80.library_members_to_bin(members))
+
+def create(args):
+    if os.path.exists(args.library):
+        omf80.error(f'{args.library} already exists')
+    write_library(args.library, [])
+
+def add(args):
+    members = read_members(args.library)
+    names = {member['name'] for member in members}
+    for filename in args.files:
+        for member in read_members(filename):
+            if member['name'] in names:
+                omf80.error(f'{filename}: module {member["name"]} already in {args.library}')
+            names.add(member['name'])
+            members.append(member)
+    write_library(args.library, members)
+
+def delete(args):
+    members = read_members(args.library)
+    names = {member['name'] for member in members}
+    for name in args.modules:
+        if name not in names:
+            omf80.error(f'module {name} not in {args.library}')
+    write_library(args.library, [member for member in members
+                                        if member['name'] not in args.modules])
+
+def list_modules(args):
+    for filename in args.libraries:
+        print(filename)
+        for member in read_members(filename):
+            print(f'\t{member["name"]}')
+            if args.publics:
+                for name in member['public_names']:
+                    print(f'\t\t{name}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_create = commands.add_parser("create", help="create an empty library")
+    parser_create.add_argument("library")
+    parser_create.set_defaults(run=create)
+
+    parser_add = commands.add_parser("add", help="add the modules of object files or libraries")
+    parser_add.add_argument("library")
+    parser_add.add_argument("files", nargs="+", help="modules or libraries to add")
+    parser_add.set_defaults(run=add)
+
+    parser_delete = commands.add_parser("delete", help="remove modules by name")
+    parser_delete.add_argument("library")
+    parser_delete.add_argument("modules", nargs="+", help="names of the modules")
+    parser_delete.set_defaults(run=delete)
+
+    parser_list = commands.add_parser("list", help="list the modules of libraries")
+    parser_list.add_argument("libraries", nargs="+")
+    parser_list.add_argument("-p", "--publics", action="store_true",
+                                help="also list the public names of each module")
+    parser_list.set_defaults(run=list_modules)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)
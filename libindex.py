@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+import argparse
+
+import omf80
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("libraries", nargs="+", help="library files")
+    parser.add_argument("-f", "--force", action="store_true",
+                                help="rebuild the indexes even if they are up to date")
+    parser.add_argument("-l", "--lookup", action="append", default=[], metavar="NAME",
+                                help="print the library and the module defining NAME")
+    args = parser.parse_args()
+
+    # building the missing and stale indexes
+    indexes = [omf80.update_library_index(library, force=args.force)
+                    for library in args.libraries]
+
+    # looking up names in the libraries, in order
+    for name in args.lookup:
+        for library, index in zip(args.libraries, indexes):
+            found = index.lookup(name)
+            if found is not None:
+                module, offset = found
+                print(f'{name}\t{library}\tmodule {module}\toffset {offset:#06x}')
+                break
+        else:
+            print(f'{name}\tnot found')
+
+if __name__ == "__main__":
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)
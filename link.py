@@ -12,6 +12,16 @@ def main():
     parser.add_argument("-o", "--out", nargs="?", help="output file")
     parser.add_argument("-v", "--verbose", help="increase output verbosity",
                                                         action="store_true")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                                help="number of processes parsing the input files")
+    parser.add_argument("--no-cache", action="store_true",
+                                help="do not use the cache of parsed files")
+    parser.add_argument("--verify", choices=omf80.VERIFY_MODES, default=omf80.VERIFY_STRICT,
+                                help="check the record checksums one by one (strict), all at once (fast) or not at all (off)")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                                help="relink only the changed modules, keeping the state of the link next to the output file")
+    parser.add_argument("--gc-modules", action="store_true",
+                                help="leave out the modules the main module does not need")
     args = parser.parse_args()
 
     files_in = args.files_in
@@ -23,26 +33,22 @@ def main():
     logging.debug(f'files_in = {files_in}')
     logging.debug(f'file_out = {file_out}')
 
-    # reading the files    
-    lst = []
-    for filename in files_in:
-        f = open(filename, "rb")
-        data = f.read()
-        f.close()
-        records = omf80.read_omf80(data)
-        assert records[-1]['rec_typ'] == omf80.END_OF_FILE_RECORD
-        lst.append(omf80.read_records(records[:-1]))
+    # reading the files, in order
+    cache = None if args.no_cache else omf80.ObjectCache()
+    state_file = f'{file_out}.lnk' if args.incremental else None
 
     # creating the output module
-    module = omf80.link(lst)
+    module = omf80.link_files(files_in, state_file=state_file, jobs=args.jobs,
+                                    cache=cache, gc=args.gc_modules, verify=args.verify)
 
     # writing the output to file
     r0 = omf80.module_to_records(module)
     r1 = omf80.add_eof(r0)
-    bin_data = omf80.records_to_bin(r1)
     with open(file_out, 'wb') as file:
-        file.write(bin_data)
-        file.close()
+        omf80.write_omf80(r1, file)
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)
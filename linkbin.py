@@ -32,6 +32,18 @@ def main():
     parser.add_argument("-o", "--out", help="name of the binary output file")
     parser.add_argument("--code", help="start of the code segment")
     parser.add_argument("--stack", help="size of the stack segment")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                                help="number of processes parsing the input files")
+    parser.add_argument("--no-cache", action="store_true",
+                                help="do not use the cache of parsed files")
+    parser.add_argument("--verify", choices=omf80.VERIFY_MODES, default=omf80.VERIFY_STRICT,
+                                help="check the record checksums one by one (strict), all at once (fast) or not at all (off)")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                                help="relink only the changed modules, keeping the state of the link next to the output file")
+    parser.add_argument("--gc-modules", action="store_true",
+                                help="leave out the modules the main module does not need")
+    parser.add_argument("--hex", action="store_true",
+                                help="write Intel HEX instead of a binary image")
 
     args = parser.parse_args()
 
@@ -42,19 +54,22 @@ def main():
 
     pprinter = HexIntPrettyPrinter()
 
-    lst = []
-    for file in files:
-        f = open(file, "rb")
-        data = f.read()
-        f.close()
-        records = omf80.read_omf80(data)
-        assert records[-1]['rec_typ'] == omf80.END_OF_FILE_RECORD
-        lst.append(omf80.read_records(records[:-1]))
-    module = omf80.link(lst)
-#    pprinter.pprint(module)
-
-    omf80.module_adjust(module, code_start=code_start, stack_size=stack_size)
-    bin_data = omf80.module_to_bin(module)
+    cache = None if args.no_cache else omf80.ObjectCache()
+    if args.incremental or args.hex:
+        # the incremental link and the Intel HEX output need the linked module
+        state_file = f'{file_out}.lnk' if args.incremental else None
+        module = omf80.link_files(files, state_file=state_file, jobs=args.jobs,
+                                        cache=cache, gc=args.gc_modules, verify=args.verify)
+#        pprinter.pprint(module)
+        omf80.module_adjust(module, code_start=code_start, stack_size=stack_size)
+        if args.hex:
+            bin_data = omf80.module_to_hex(module, start=code_start).encode('ascii')
+        else:
+            bin_data = omf80.module_to_bin(module)
+    else:
+        lst = omf80.load_objects(files, jobs=args.jobs, cache=cache, verify=args.verify)
+        bin_data = omf80.link_to_bin(lst, code_start=code_start, stack_size=stack_size,
+                                        gc=args.gc_modules)
 
     with open(file_out, 'wb') as file:
         file.write(bin_data)
@@ -62,4 +77,7 @@ def main():
     
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)
@@ -24,6 +24,12 @@ def main():
     parser.add_argument("--stack", help="size of the stack segment")
     parser.add_argument("-v", "--verbose", help="increase output verbosity",
                                                         action="store_true")
+    parser.add_argument("--no-cache", action="store_true",
+                                help="do not use the cache of parsed files")
+    parser.add_argument("--verify", choices=omf80.VERIFY_MODES, default=omf80.VERIFY_STRICT,
+                                help="check the record checksums one by one (strict), all at once (fast) or not at all (off)")
+    parser.add_argument("--hex", action="store_true",
+                                help="write Intel HEX instead of a binary image")
     args = parser.parse_args()
 
     file_in = args.file_in
@@ -39,16 +45,14 @@ def main():
     logging.info(f'code_start = 0x{code_start:x} ({code_start})')
     logging.info(f'stack_size = 0x{stack_size:x} ({stack_size})')
 
-    omf_file = open(file_in, "rb")
-    omf_data = omf_file.read()
-    omf_file.close()
-    records = omf80.read_omf80(omf_data)
-
-    mrecs = records[:-1]
-    module = omf80.records_to_module(mrecs)
+    cache = None if args.no_cache else omf80.ObjectCache()
+    module = omf80.load_object(file_in, cache=cache, verify=args.verify)
 
     omf80.module_adjust(module, code_start=code_start, stack_size=stack_size)
-    bin_data = omf80.module_to_bin(module)
+    if args.hex:
+        bin_data = omf80.module_to_hex(module, start=code_start).encode('ascii')
+    else:
+        bin_data = omf80.module_to_bin(module)
 
     bin_file = open(file_out, "wb")
     bin_file.write(bin_data)
@@ -56,4 +60,7 @@ def main():
     logging.info('DONE')
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)
@@ -1,5 +1,18 @@
 #!/usr/bin/env python3
 
+import bisect
+import collections
+import functools
+import hashlib
+import itertools
+import mmap
+import operator
+import os
+import pickle
+import struct
+import sys
+from array import array
+
 ABSOLUTE_SEGMENT = 0
 CODE_SEGMENT = 1
 DATA_SEGMENT = 2
@@ -26,21 +39,35 @@ LIBRARY_MODULE_NAMES_RECORD = 0x28
 LIBRARY_MODULE_LOCATIONS_RECORD = 0x26
 LIBRARY_DICTIONARY_RECORD = 0x2a
 
-def get_str8(data):
-    length = data[0]
-    result = []
-    for i in range(1, length+1):
-        result.append(data[i])
-    return bytearray(result).decode("ascii")
-
-def write_str8(data):
-    result = bytearray(len(data)+1)
-    result[0] = len(data)
-    result[1:] = data.encode('ascii')
-    return result
-
-def read16(data):
-    return int.from_bytes(data[0:2], 'little', signed=False)
+U16 = struct.Struct('<H')
+U16_PAIR = struct.Struct('<HH')
+U16_BE = struct.Struct('>H')
+RECORD_HEADER = struct.Struct('<BH')
+SEGMENT_DEFINITION = struct.Struct('<BHB')
+CONTENT_HEADER = struct.Struct('<BH')
+MODULE_END = struct.Struct('<BBH')
+LIBRARY_HEADER = struct.Struct('<HHH')
+RECORD_HEADER_SPACE = bytes(RECORD_HEADER.size)
+
+def get_str8(data, offset=0):
+    length = data[offset]
+    return str(data[offset+1:offset+1+length], "ascii")
+
+def read16(data, offset=0):
+    return U16.unpack_from(data, offset)[0]
+
+# all the little endian 16-bit words of data from offset, decoded at once
+def read16_list(data, offset=0):
+    count, rest = divmod(len(data) - offset, 2)
+    if rest != 0:
+        raise ValueError(f'{len(data) - offset} bytes of 16-bit words')
+    return list(struct.unpack_from(f'<{count}H', data, offset))
+
+# fixed size entries of data from offset, decoded at once
+def iter_unpack_from(layout, data, offset=0):
+    if (len(data) - offset) % layout.size != 0:
+        raise ValueError(f'{len(data) - offset} bytes of {layout.size}-byte entries')
+    return layout.iter_unpack(data[offset:])
 
 def check_ok(data):
     s = sum(data)
@@ -51,261 +78,573 @@ def error(msg):
     print(f'error: {msg}')
     exit(1)
 
+# malformed input, found at offset in the buffer being read, in a record of
+# type rec_typ when it is known
+class OMFError(Exception):
+
+    def __init__(self, message, offset=None, rec_typ=None):
+        super().__init__(message, offset, rec_typ)
+        self.message = message
+        self.offset = offset
+        self.rec_typ = rec_typ
+
+    def __str__(self):
+        where = []
+        if self.rec_typ is not None:
+            where.append(f'record 0x{self.rec_typ:02x}')
+        if self.offset is not None:
+            where.append(f'offset 0x{self.offset:x}')
+        if len(where) == 0:
+            return self.message
+        return f'{self.message} ({" at ".join(where)})'
+
+class ChecksumError(OMFError):
+    pass
+
+# checking the record checksums when reading: each record as it is decoded
+# (strict), all the records of a buffer in one pass before decoding (fast),
+# or not at all (off), for trusted files
+VERIFY_STRICT = 'strict'
+VERIFY_FAST = 'fast'
+VERIFY_OFF = 'off'
+VERIFY_MODES = (VERIFY_STRICT, VERIFY_FAST, VERIFY_OFF)
+
+
+# RECORDS AND MODULE ENTRIES
+# Records and the entries of the module model are small objects with fixed
+# fields stored in __slots__.  They can still be used like the dicts they
+# replace: record["name"], "internal" in cdef, cdef.setdefault(...), where
+# a field that was never set is a missing key.
+class Fields:
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def field_names(self):
+        return self.__slots__
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self.field_names() and hasattr(self, key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def keys(self):
+        return [key for key in self.field_names() if hasattr(self, key)]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def copy(self):
+        result = type(self).__new__(type(self))
+        for key in self.__slots__:
+            if hasattr(self, key):
+                setattr(result, key, getattr(self, key))
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, (Fields, dict)):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self.items())})'
+
+class Segment(Fields):
+    __slots__ = ("seg_length", "aln_typ")
+
+    def __init__(self, seg_length, aln_typ):
+        self.seg_length = seg_length
+        self.aln_typ = aln_typ
+
+# a public name, a local symbol or an external reference by name
+class Symbol(Fields):
+    __slots__ = ("name", "offset")
+
+    def __init__(self, name, offset):
+        self.name = name
+        self.offset = offset
+
+class LineNumber(Fields):
+    __slots__ = ("offset", "line_number")
+
+    def __init__(self, offset, line_number):
+        self.offset = offset
+        self.line_number = line_number
+
+class ExternalReference(Fields):
+    __slots__ = ("name_index", "offset")
+
+    def __init__(self, name_index, offset):
+        self.name_index = name_index
+        self.offset = offset
+
+class CommonName(Fields):
+    __slots__ = ("seg_id", "common_name")
+
+    def __init__(self, seg_id, common_name):
+        self.seg_id = seg_id
+        self.common_name = common_name
+
+class ModuleLocation(Fields):
+    __slots__ = ("block_number", "byte_number")
+
+    def __init__(self, block_number, byte_number):
+        self.block_number = block_number
+        self.byte_number = byte_number
+
+# a module of a library as written to the library file: its name, its
+# public names for the dictionary, and its records, in binary
+class LibraryMember(Fields):
+    __slots__ = ("name", "public_names", "data")
+
+    def __init__(self, name, public_names, data):
+        self.name = name
+        self.public_names = public_names
+        self.data = data
+
+# "internal" maps (seg_id, lo_hi_both) to the offsets to relocate and
+# "external" maps lo_hi_both to the Symbols to resolve; both are optional
+class ContentDefinition(Fields):
+    __slots__ = ("seg_id", "offset", "data", "internal", "external")
+
+    def __init__(self, seg_id, offset, data):
+        self.seg_id = seg_id
+        self.offset = offset
+        self.data = data
+
+# the record type is a class attribute, rec_typ reads like the other fields
+class Record(Fields):
+    __slots__ = ()
+    rec_typ = None
+    record_fields = ("rec_typ",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.record_fields = ("rec_typ",) + cls.__slots__
+
+    def field_names(self):
+        return self.record_fields
+
+class ModuleHeaderRecord(Record):
+    __slots__ = ("name", "segments")
+    rec_typ = MODULE_HEADER_RECORD
+
+class LocalSymbolsRecord(Record):
+    __slots__ = ("seg_id", "symbols")
+    rec_typ = LOCAL_SYMBOLS_RECORD
+
+class ExternalNamesRecord(Record):
+    __slots__ = ("names",)
+    rec_typ = EXTERNAL_NAMES_RECORD
+
+class PublicDeclarationRecord(Record):
+    __slots__ = ("seg_id", "public_names")
+    rec_typ = PUBLIC_DECLARATION_RECORD
+
+class LineNumbersRecord(Record):
+    __slots__ = ("seg_id", "line_numbers")
+    rec_typ = LINE_NUMBERS_RECORD
+
+class ContentRecord(Record):
+    __slots__ = ("seg_id", "offset", "dat")
+    rec_typ = CONTENT_RECORD
+
+class IntersegmentReferencesRecord(Record):
+    __slots__ = ("seg_id", "lo_hi_both", "offsets")
+    rec_typ = INTERSEGMENT_REFERENCES_RECORD
+
+class RelocationRecord(Record):
+    __slots__ = ("lo_hi_both", "offsets")
+    rec_typ = RELOCATION_RECORD
+
+class ExternalReferencesRecord(Record):
+    __slots__ = ("lo_hi_both", "references")
+    rec_typ = EXTERNAL_REFERENCES_RECORD
+
+class NamedCommonDefinitionsRecord(Record):
+    __slots__ = ("common_names",)
+    rec_typ = NAMED_COMMON_DEFINITIONS_RECORD
+
+class ModuleAncestorRecord(Record):
+    __slots__ = ("module_name",)
+    rec_typ = MODULE_ANCESTOR_RECORD
+
+class ModuleEndRecord(Record):
+    __slots__ = ("mod_typ", "seg_id", "offset", "optional_info")
+    rec_typ = MODULE_END_RECORD
+
+class EndOfFileRecord(Record):
+    __slots__ = ()
+    rec_typ = END_OF_FILE_RECORD
+
+class LibraryHeaderRecord(Record):
+    __slots__ = ("module_count", "block_number", "byte_number")
+    rec_typ = LIBRARY_HEADER_RECORD
+
+class LibraryModuleNamesRecord(Record):
+    __slots__ = ("module_names",)
+    rec_typ = LIBRARY_MODULE_NAMES_RECORD
+
+class LibraryModuleLocationsRecord(Record):
+    __slots__ = ("pairs",)
+    rec_typ = LIBRARY_MODULE_LOCATIONS_RECORD
+
+class LibraryDictionaryRecord(Record):
+    __slots__ = ("module_groups",)
+    rec_typ = LIBRARY_DICTIONARY_RECORD
+
+
+# LINE NUMBER AND SYMBOL TABLES
+# The line numbers and the symbols of a segment are kept in parallel
+# columns: an array of 16-bit offsets and an array of line numbers or a
+# list of interned names.  Entries can be added in any order; sort() orders
+# them once, after which find() and lookup() bisect the offsets.
+# Iterating a table yields LineNumber or Symbol objects, like the lists of
+# entries they replace.
+class OffsetTable:
+    __slots__ = ("offsets", "values", "is_sorted")
+
+    def __init__(self, entries=()):
+        self.offsets = array('H')
+        self.values = self.new_values()
+        self.is_sorted = True
+        if entries:
+            self.extend(entries)
+
+    def add(self, offset, value):
+        if self.is_sorted and len(self.offsets) > 0 and offset < self.offsets[-1]:
+            self.is_sorted = False
+        self.offsets.append(offset)
+        self.values.append(value)
+
+    # entries are another table, whose columns are copied, or entry objects
+    def extend(self, entries):
+        if isinstance(entries, OffsetTable):
+            self.extend_columns(entries.offsets, entries.values)
+        else:
+            self.extend_columns(*self.columns(entries))
+
+    def extend_columns(self, offsets, values):
+        start = len(self.offsets)
+        self.offsets.extend(offsets)
+        self.values.extend(values)
+        if self.is_sorted:
+            self.is_sorted = is_ascending(self.offsets[max(start - 1, 0):])
+
+    def sort(self):
+        if self.is_sorted:
+            return
+        offsets = self.offsets
+        order = sorted(range(len(offsets)), key=offsets.__getitem__)
+        self.offsets = array('H', [offsets[i] for i in order])
+        self.values = self.new_values([self.values[i] for i in order])
+        self.is_sorted = True
+
+    # index of the last entry at or before offset, -1 if there is none
+    def find(self, offset):
+        self.sort()
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        for index in range(len(self.offsets)):
+            yield self[index]
+
+    def copy(self):
+        result = type(self)()
+        result.offsets = array('H', self.offsets)
+        result.values = self.new_values(self.values)
+        result.is_sorted = self.is_sorted
+        return result
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({list(self)})'
+
+def is_ascending(offsets):
+    return all(map(operator.le, offsets, offsets[1:]))
+
+class LineTable(OffsetTable):
+    __slots__ = ()
+
+    def new_values(self, values=()):
+        return array('H', values)
+
+    def append(self, lnum):
+        self.add(lnum["offset"], lnum["line_number"])
+
+    def columns(self, lnums):
+        return [lnum.offset for lnum in lnums], [lnum.line_number for lnum in lnums]
+
+    # the table of the (offset, line number) pairs of little endian words
+    # in data, split into the two columns without decoding the pairs
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) % U16_PAIR.size != 0:
+            raise ValueError(f'{len(data)} bytes of {U16_PAIR.size}-byte entries')
+        words = array('H')
+        words.frombytes(data)
+        if sys.byteorder != 'little':
+            words.byteswap()
+        table = cls()
+        table.offsets = words[0::2]
+        table.values = words[1::2]
+        table.is_sorted = is_ascending(table.offsets)
+        return table
+
+    def __getitem__(self, index):
+        return LineNumber(self.offsets[index], self.values[index])
+
+    # line number of the code at offset, None before the first line
+    def lookup(self, offset):
+        index = self.find(offset)
+        if index < 0:
+            return None
+        return self.values[index]
+
+class SymbolTable(OffsetTable):
+    __slots__ = ()
+
+    def new_values(self, values=()):
+        return list(values)
+
+    def append(self, symbol):
+        self.add(symbol["offset"], sys.intern(symbol["name"]))
+
+    def columns(self, symbols):
+        return [symbol.offset for symbol in symbols], [sys.intern(symbol.name) for symbol in symbols]
+
+    def __getitem__(self, index):
+        return Symbol(self.values[index], self.offsets[index])
+
+    # nearest symbol at or before offset, None before the first symbol
+    def lookup(self, offset):
+        index = self.find(offset)
+        if index < 0:
+            return None
+        return self[index]
+
 
 # PARSE BINARY RECORD DATA
+# The readers receive the record payload (without type, length and checksum)
+# as a memoryview and decode the fields by offset, without slicing copies.
 def read_module_header_record(data):
-    rec_typ = MODULE_HEADER_RECORD
-    name = get_str8(data[0:])
-    i = 1 + len(name) + 2
+    name = get_str8(data)
     segments = {}
-    while i < len(data):
-        seg_id = int(data[i])
-        segment = {}
-        segment["seg_length"] = read16(data[i+1:])
-        segment["aln_typ"] = data[i+3]
-        segments[seg_id] = segment
-        i += 4
-    record = {"rec_typ": rec_typ, "name": name, "segments": segments}
-    return record
+    for seg_id, seg_length, aln_typ in iter_unpack_from(SEGMENT_DEFINITION, data, 1 + len(name) + 2):
+        segments[seg_id] = Segment(seg_length, aln_typ)
+    return ModuleHeaderRecord(name=name, segments=segments)
 
 def read_local_symbols_record(data):
-    rec_typ = LOCAL_SYMBOLS_RECORD
     seg_id = data[0]
     i = 1
     symbols = []
     while i < len(data):
-        symbol = {}
-        symbol["offset"] = read16(data[i+0:])
-        name = get_str8(data[i+2:])
-        symbol["name"] = name
-        symbols.append(symbol)
+        offset = read16(data, i)
+        name = get_str8(data, i+2)
+        symbols.append(Symbol(name, offset))
         i += 2 + 1 + len(name) + 1
-    record = {"rec_typ": rec_typ, "seg_id": seg_id, "symbols": symbols}
-    return record
+    return LocalSymbolsRecord(seg_id=seg_id, symbols=symbols)
 
 def read_external_names_record(data):
-    rec_typ = EXTERNAL_NAMES_RECORD
     i = 0
     names = []
     while i < len(data):
-        name = get_str8(data[i:])
+        name = get_str8(data, i)
         names.append(name)
         i += (1 + len(name)) + 1
-    record = {"rec_typ": rec_typ, "names": names}
-    return record
+    return ExternalNamesRecord(names=names)
 
 def read_public_declaration_record(data):
-    rec_typ = PUBLIC_DECLARATION_RECORD
     seg_id = data[0]
     i = 1
     public_names = []
     while i < len(data):
-        public_name = {}
-        public_name["offset"] = read16(data[i+0:])
-        name = get_str8(data[i+2:])
-        public_name["name"] = name
-        public_names.append(public_name)
+        offset = read16(data, i)
+        name = get_str8(data, i+2)
+        public_names.append(Symbol(name, offset))
         i = i + 2 + 1 + len(name) + 1
-    record = {"rec_typ": rec_typ, "seg_id": seg_id, "public_names": public_names}
-    return record
+    return PublicDeclarationRecord(seg_id=seg_id, public_names=public_names)
 
 def read_line_numbers_record(data):
-    rec_typ = LINE_NUMBERS_RECORD
     seg_id = data[0]
-    i = 1
-    line_numbers = []
-    while i < len(data):
-        lnum = {}
-        lnum["offset"] = read16(data[i+0:])
-        lnum["line_number"] = read16(data[i+2:])
-        line_numbers.append(lnum)
-        i = i + 4
-    record = {"rec_typ": rec_typ, "seg_id": seg_id, "line_numbers": line_numbers}
-    return record
+    line_numbers = LineTable.from_bytes(data[1:])
+    return LineNumbersRecord(seg_id=seg_id, line_numbers=line_numbers)
 
 def read_content_record(data):
-    rec_typ = CONTENT_RECORD
     seg_id = data[0]
-    offset = read16(data[1:])
-    i = 3
-    dat = bytearray()
-    while i < len(data):
-        dat.append(data[i])
-        i += 1
-    record = {"rec_typ": rec_typ, "seg_id": seg_id, "offset": offset, "dat": dat}
-    return record
+    offset = read16(data, 1)
+    dat = bytearray(data[3:])
+    return ContentRecord(seg_id=seg_id, offset=offset, dat=dat)
 
 def read_intersegment_references_record(data):
-    rec_typ = INTERSEGMENT_REFERENCES_RECORD
     seg_id = data[0]
     lo_hi_both = data[1]
-    i = 2
-    offsets = []
-    while i < len(data):
-        offset = read16(data[i:])
-        offsets.append(offset)
-        i += 2
-    record = {"rec_typ": rec_typ, "seg_id": seg_id, "lo_hi_both": lo_hi_both, "offsets": offsets}
-    return record
+    offsets = read16_list(data, 2)
+    return IntersegmentReferencesRecord(seg_id=seg_id, lo_hi_both=lo_hi_both, offsets=offsets)
 
 def read_relocation_record(data):
-    rec_typ = RELOCATION_RECORD
     lo_hi_both = data[0]
-    i = 1
-    offsets = []
-    while i < len(data):
-        offsets.append(read16(data[i:]))
-        i += 2
-    record = {"rec_typ": rec_typ, "lo_hi_both": lo_hi_both, "offsets": offsets}
-    return record
+    offsets = read16_list(data, 1)
+    return RelocationRecord(lo_hi_both=lo_hi_both, offsets=offsets)
 
 def read_external_references_record(data):
-    rec_typ = EXTERNAL_REFERENCES_RECORD
     lo_hi_both = data[0]
-    i = 1
-    references = []
-    while i < len(data):
-        reference = {}
-        reference["name_index"] = read16(data[i:])
-        reference["offset"] = read16(data[i+2:])
-        references.append(reference)
-        i += 4
-    record = {"rec_typ": rec_typ, "lo_hi_both": lo_hi_both, "references": references}
-    return record
+    references = [ExternalReference(name_index, offset)
+                    for name_index, offset in iter_unpack_from(U16_PAIR, data, 1)]
+    return ExternalReferencesRecord(lo_hi_both=lo_hi_both, references=references)
     
 def read_named_common_definitions_record(data):
-    rec_typ = NAMED_COMMON_DEFINITIONS_RECORD
     seg_id = data[0]
     i = 1
     cns = []
     while i < len(data):
-        cn = {}
-        cn["seg_id"] = data[i]
-        name = get_str8(data[i+1:])
-        cn["common_name"] = name
-        cns.append(cn)
+        name = get_str8(data, i+1)
+        cns.append(CommonName(data[i], name))
         i += 1 + (1 + len(name))
-    record = {"rec_typ": rec_typ, "common_names": cns}
-    return record
+    return NamedCommonDefinitionsRecord(common_names=cns)
 
 def read_module_ancestor_record(data):
-    rec_typ = MODULE_ANCESTOR_RECORD
     module_name = get_str8(data)
-    record = {"rec_typ": rec_typ, "module_name": module_name}
-    return record
+    return ModuleAncestorRecord(module_name=module_name)
 
 def read_module_end_record(data):
-    rec_typ = MODULE_END_RECORD
     mod_typ = data[0]
     seg_id = data[1]
-    offset = read16(data[2:])
-    optional_info = []
-    i = 4
-    if i < len(data):
-        while i < length + 3:
-            optional_info.append(data[i])
-            i += 1
-    record = {"rec_typ": rec_typ, "mod_typ": mod_typ, "seg_id": seg_id,
-                "offset": offset, "optional_info": optional_info}
-    return record
+    offset = read16(data, 2)
+    optional_info = list(data[4:])
+    return ModuleEndRecord(mod_typ=mod_typ, seg_id=seg_id,
+                offset=offset, optional_info=optional_info)
 
 def read_end_of_file_record(data):
-    rec_typ = END_OF_FILE_RECORD
-    record = {"rec_typ": rec_typ}
-    return record
+    return EndOfFileRecord()
 
 def read_library_header_record(data):
-    rec_typ = LIBRARY_HEADER_RECORD
-    module_count = read16(data[0:])
-    block_number = read16(data[2:])
-    byte_number = read16(data[4:])
-    record = {"rec_typ": rec_typ, "module_count": module_count,
-        "block_number": block_number, "byte_number": byte_number}
-    return record
+    module_count = read16(data, 0)
+    block_number = read16(data, 2)
+    byte_number = read16(data, 4)
+    return LibraryHeaderRecord(module_count=module_count,
+        block_number=block_number, byte_number=byte_number)
 
 def read_library_module_names_record(data):
-    rec_typ = LIBRARY_MODULE_NAMES_RECORD
     module_names = []
     i = 0
     while i < len(data):
-        name = get_str8(data[i:])
+        name = get_str8(data, i)
         i += len(name) + 1
         module_names.append(name)
-    record = {"rec_typ": rec_typ, "module_names": module_names}
-    return record
+    return LibraryModuleNamesRecord(module_names=module_names)
 
 def read_library_module_locations_record(data):
-    rec_typ = LIBRARY_MODULE_LOCATIONS_RECORD
-    i = 0
-    pairs = []
-    while i < len(data):
-        block_number = read16(data[i:])
-        byte_number = read16(data[i+2:])
-        i += 4
-        pairs.append({"block_number": block_number, "byte_number": byte_number})
-    record = {"rec_typ": rec_typ, "pairs": pairs}
-    return record
+    pairs = [ModuleLocation(block_number, byte_number)
+                for block_number, byte_number in iter_unpack_from(U16_PAIR, data)]
+    return LibraryModuleLocationsRecord(pairs=pairs)
 
 def read_library_dictionary_record(data):
-    rec_typ = LIBRARY_DICTIONARY_RECORD
     i = 0
     module_groups = []
     while i < len(data):
         module_group = []
         while data[i] != 0:
-            public_name = get_str8(data[i:])
+            public_name = get_str8(data, i)
             i += len(public_name) + 1
             module_group.append(public_name)
         i += 1
         module_groups.append(module_group)
-    record = {"rec_typ": rec_typ, "module_groups": module_groups}
-    return record
-
-def bin_to_record(data):
+    return LibraryDictionaryRecord(module_groups=module_groups)
+
+record_readers = {
+    MODULE_HEADER_RECORD: read_module_header_record,
+    LOCAL_SYMBOLS_RECORD: read_local_symbols_record,
+    EXTERNAL_NAMES_RECORD: read_external_names_record,
+    PUBLIC_DECLARATION_RECORD: read_public_declaration_record,
+    LINE_NUMBERS_RECORD: read_line_numbers_record,
+    CONTENT_RECORD: read_content_record,
+    INTERSEGMENT_REFERENCES_RECORD: read_intersegment_references_record,
+    RELOCATION_RECORD: read_relocation_record,
+    EXTERNAL_REFERENCES_RECORD: read_external_references_record,
+    MODULE_END_RECORD: read_module_end_record,
+    NAMED_COMMON_DEFINITIONS_RECORD: read_named_common_definitions_record,
+    MODULE_ANCESTOR_RECORD: read_module_ancestor_record,
+    END_OF_FILE_RECORD: read_end_of_file_record,
+    LIBRARY_HEADER_RECORD: read_library_header_record,
+    LIBRARY_MODULE_NAMES_RECORD: read_library_module_names_record,
+    LIBRARY_MODULE_LOCATIONS_RECORD: read_library_module_locations_record,
+    LIBRARY_DICTIONARY_RECORD: read_library_dictionary_record,
+}
+
+# data is the whole record, a memoryview into the file buffer
+# decode one record; offset, where it is in the file, is only reported in
+# the errors
+def bin_to_record(data, verify=True, offset=None):
     type = data[0]
-    if not check_ok(data):
-        print("check not OK")
-        exit(0)
-    if type == MODULE_HEADER_RECORD:
-        return read_module_header_record(data[3:-1])
-    elif type == LOCAL_SYMBOLS_RECORD:
-        return read_local_symbols_record(data[3:-1])
-    elif type == EXTERNAL_NAMES_RECORD:
-        return read_external_names_record(data[3:-1])
-    elif type == PUBLIC_DECLARATION_RECORD:
-        return read_public_declaration_record(data[3:-1])
-    elif type == LINE_NUMBERS_RECORD:
-        return read_line_numbers_record(data[3:-1])
-    elif type == CONTENT_RECORD:
-        return read_content_record(data[3:-1])
-    elif type == INTERSEGMENT_REFERENCES_RECORD:
-        return read_intersegment_references_record(data[3:-1])
-    elif type == RELOCATION_RECORD:
-        return read_relocation_record(data[3:-1])
-    elif type == EXTERNAL_REFERENCES_RECORD:
-        return read_external_references_record(data[3:-1])
-    elif type == MODULE_END_RECORD:
-        return read_module_end_record(data[3:-1])
-    elif type == NAMED_COMMON_DEFINITIONS_RECORD:
-        return read_named_common_definitions_record(data[3:-1])
-    elif type == MODULE_ANCESTOR_RECORD:
-        return read_module_ancestor_record(data[3:-1])
-    elif type == END_OF_FILE_RECORD:
-        return read_end_of_file_record(data[3:-1])
-    elif type == LIBRARY_HEADER_RECORD:
-        return read_library_header_record(data[3:-1])
-    elif type == LIBRARY_MODULE_NAMES_RECORD:
-        return read_library_module_names_record(data[3:-1])
-    elif type == LIBRARY_MODULE_LOCATIONS_RECORD:
-        return read_library_module_locations_record(data[3:-1])
-    elif type == LIBRARY_DICTIONARY_RECORD:
-        return read_library_dictionary_record(data[3:-1])
-    else:
-        print(f"omf80: record type not supported 0x{type:02x}")
-        exit(0)
+    if verify and not check_ok(data):
+        raise ChecksumError('bad checksum', offset, type)
+    reader = record_readers.get(type)
+    if reader is None:
+        raise OMFError('record type not supported', offset, type)
+    try:
+        return reader(data[3:-1])
+    except (struct.error, IndexError, ValueError) as e:
+        # the payload is shorter than its contents say
+        raise OMFError(f'malformed record: {e}', offset, type) from None
 
 
 # CONVERT RECORDS TO STRING
+# the bytes of data in hex, 16 per line, each followed by a space, the
+# first line after prefix
+def hex_dump(data, prefix):
+    with memoryview(data) as view:
+        lines = [view[i:i+16].hex(' ') + ' ' for i in range(0, len(view), 16)]
+    return prefix + "\n\t      ".join(lines)
+
 def module_header_record_to_string(record):
     result = ["MODULE HEADER RECORD"]
     result.append(f'\tMODULE NAME =\"{record["name"]}\"')
@@ -356,22 +695,16 @@ def line_numbers_record_to_string(record):
         result.append(f"\tOFFSET = 0x{offset:04x}, LINE NUMBER = {line_number}")
     return "\n".join(result)
 
-def content_record_to_string(record):
+def content_record_to_string(record, data=True):
     result = ['CONTENT RECORD']
     seg_id = record["seg_id"]
     result.append(f"\tSEG ID = {seg_id}")
     offset = record["offset"]
     result.append(f"\tOFFSET = 0x{offset:04x}")
-    dat = record["dat"]
-    str = "\tDAT = "
-    i = 0
-    for d in dat:
-        str += f"{d:02x} "
-        i += 1
-        if i % 16 == 0 and i != len(dat) :
-            result.append(str)
-            str = "\t      "
-    result.append(str)
+    if not data:
+        result.append(f"\tLENGTH = {len(record['dat'])}")
+        return "\n".join(result)
+    result.append(hex_dump(record["dat"], "\tDAT = "))
     return "\n".join(result)
 
 def intersegment_references_record_to_string(record):
@@ -430,15 +763,7 @@ def module_end_record_to_string(record):
     result.append(f"\tOFFSET = 0x{offset:04x}")
     optional_info = record["optional_info"]
     if len(optional_info) > 0:
-        str = f"\tOPTIONAL INFO = "
-        i = 0
-        while i < length:
-            str += f"{optional_info[i]:02x} "
-            i += 1
-            if i % 16 == 0 and i != len(optional_info):
-                result.append(str)
-                str = "\t      "
-        result.append(str)
+        result.append(hex_dump(bytes(optional_info), "\tOPTIONAL INFO = "))
     return "\n".join(result)
 
 def library_header_record_to_string(record):
@@ -473,245 +798,367 @@ def library_dictionary_record_to_string(record):
 def end_of_file_record_to_string(record):
     return "END OF FILE RECORD"
 
-def record_to_string(record):
+record_formatters = {
+    MODULE_HEADER_RECORD: module_header_record_to_string,
+    LOCAL_SYMBOLS_RECORD: local_symbols_record_to_string,
+    EXTERNAL_NAMES_RECORD: external_names_record_to_string,
+    PUBLIC_DECLARATION_RECORD: public_declaration_record_to_string,
+    LINE_NUMBERS_RECORD: line_numbers_record_to_string,
+    CONTENT_RECORD: content_record_to_string,
+    INTERSEGMENT_REFERENCES_RECORD: intersegment_references_record_to_string,
+    RELOCATION_RECORD: relocation_record_to_string,
+    EXTERNAL_REFERENCES_RECORD: external_references_record_to_string,
+    NAMED_COMMON_DEFINITIONS_RECORD: named_common_definitions_record_to_string,
+    MODULE_ANCESTOR_RECORD: module_ancestor_record_to_string,
+    MODULE_END_RECORD: module_end_record_to_string,
+    LIBRARY_HEADER_RECORD: library_header_record_to_string,
+    LIBRARY_MODULE_NAMES_RECORD: library_module_names_record_to_string,
+    LIBRARY_MODULE_LOCATIONS_RECORD: library_module_locations_record_to_string,
+    LIBRARY_DICTIONARY_RECORD: library_dictionary_record_to_string,
+    END_OF_FILE_RECORD: end_of_file_record_to_string,
+}
+
+# without data, the bytes of the content records are left out
+def record_to_string(record, data=True):
     type = record["rec_typ"]
-    if type == MODULE_HEADER_RECORD:
-        return module_header_record_to_string(record)
-    elif type == LOCAL_SYMBOLS_RECORD:
-        return local_symbols_record_to_string(record)
-    elif type == EXTERNAL_NAMES_RECORD:
-        return external_names_record_to_string(record)
-    elif type == PUBLIC_DECLARATION_RECORD:
-        return public_declaration_record_to_string(record)
-    elif type == LINE_NUMBERS_RECORD:
-        return line_numbers_record_to_string(record)
-    elif type == CONTENT_RECORD:
-        return content_record_to_string(record)
-    elif type == INTERSEGMENT_REFERENCES_RECORD:
-        return intersegment_references_record_to_string(record)
-    elif type == RELOCATION_RECORD:
-        return relocation_record_to_string(record)
-    elif type == EXTERNAL_REFERENCES_RECORD:
-        return external_references_record_to_string(record)
-    elif type == NAMED_COMMON_DEFINITIONS_RECORD:
-        return named_common_definitions_record_to_string(record)
-    elif type == MODULE_ANCESTOR_RECORD:
-        return module_ancestor_record_to_string(record)
-    elif type == MODULE_END_RECORD:
-        return module_end_record_to_string(record)
-    elif type == LIBRARY_HEADER_RECORD:
-        return library_header_record_to_string(record)
-    elif type == LIBRARY_MODULE_NAMES_RECORD:
-        return library_module_names_record_to_string(record)
-    elif type == LIBRARY_MODULE_LOCATIONS_RECORD:
-        return library_module_locations_record_to_string(record)
-    elif type == LIBRARY_DICTIONARY_RECORD:
-        return library_dictionary_record_to_string(record)
-    elif type == END_OF_FILE_RECORD:
-        return end_of_file_record_to_string(record)
-    else:
+    if not data and type == CONTENT_RECORD:
+        return content_record_to_string(record, data=False)
+    formatter = record_formatters.get(type)
+    if formatter is None:
         print(f"record_to_string: record type not supported 0x{type:02x}")
         print(record)
         exit(-1)
+    return formatter(record)
+
+# CONVERT RECORDS TO JSON
+# A record becomes a dict of JSON values: its type by name, then its
+# fields, with the entries of tables as dicts and binary data in hex.
+record_type_names = {
+    MODULE_HEADER_RECORD: 'MODULE_HEADER',
+    LOCAL_SYMBOLS_RECORD: 'LOCAL_SYMBOLS',
+    EXTERNAL_NAMES_RECORD: 'EXTERNAL_NAMES',
+    PUBLIC_DECLARATION_RECORD: 'PUBLIC_DECLARATION',
+    LINE_NUMBERS_RECORD: 'LINE_NUMBERS',
+    CONTENT_RECORD: 'CONTENT',
+    INTERSEGMENT_REFERENCES_RECORD: 'INTERSEGMENT_REFERENCES',
+    RELOCATION_RECORD: 'RELOCATION',
+    EXTERNAL_REFERENCES_RECORD: 'EXTERNAL_REFERENCES',
+    NAMED_COMMON_DEFINITIONS_RECORD: 'NAMED_COMMON_DEFINITIONS',
+    MODULE_ANCESTOR_RECORD: 'MODULE_ANCESTOR',
+    MODULE_END_RECORD: 'MODULE_END',
+    END_OF_FILE_RECORD: 'END_OF_FILE',
+    LIBRARY_HEADER_RECORD: 'LIBRARY_HEADER',
+    LIBRARY_MODULE_NAMES_RECORD: 'LIBRARY_MODULE_NAMES',
+    LIBRARY_MODULE_LOCATIONS_RECORD: 'LIBRARY_MODULE_LOCATIONS',
+    LIBRARY_DICTIONARY_RECORD: 'LIBRARY_DICTIONARY',
+}
+
+# the type of record named name (CONTENT, content_record) or numbered
+# name (6, 0x06); None if there is none
+def record_type(name):
+    key = name.upper()
+    if key.endswith('_RECORD'):
+        key = key[:-len('_RECORD')]
+    for type, type_name in record_type_names.items():
+        if type_name == key:
+            return type
+    try:
+        type = int(name, 0)
+    except ValueError:
+        return None
+    return type if type in record_type_names else None
+
+def to_json_value(value):
+    if isinstance(value, Fields):
+        return {key: to_json_value(item) for key, item in value.items()}
+    if isinstance(value, dict):
+        return {str(key): to_json_value(item) for key, item in value.items()}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value.hex()
+    if isinstance(value, (list, tuple, OffsetTable)):
+        return [to_json_value(item) for item in value]
+    return value
+
+def record_to_json(record, data=True):
+    result = {'record': record_type_names.get(record["rec_typ"], record["rec_typ"])}
+    for key, value in record.items():
+        if key == "dat" and not data:
+            result["length"] = len(value)
+            continue
+        result[key] = to_json_value(value)
+    return result
 
 
 # CONVERT RECORDS TO BINARY DATA
-def mkrec(data, type):
-    rec = bytearray(3 + len(data) + 1)
-    rec[0] = type
-    rec[1:3] = (len(data)+1).to_bytes(length=2, byteorder='little')
-    rec[3:-1] = data
-    rec[-1] = (-sum(rec))  & 0xff
-    return rec
-
-def write_module_header_record(record):
-    rec_data = bytearray()
-    rec_data += write_str8(record["name"])
-    rec_data.append(0)
-    rec_data.append(0)
-    segments = record["segments"]
-    for seg_id, segment in segments.items():
-        rec_data.append(seg_id)
-        rec_data += segment["seg_length"].to_bytes(length=2, byteorder='little')
-        rec_data.append(segment["aln_typ"])
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_local_symbols_record(record):
-    rec_data = bytearray()
-    rec_data.append(record["seg_id"])
-    symbols = record["symbols"]
-    for symbol in symbols:
-        rec_data += symbol["offset"].to_bytes(length=2, byteorder='little')
-        rec_data += write_str8(symbol["name"])
-        rec_data.append(0)
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_external_names_record(record):
-    rec_data = bytearray()
-    names = record["names"]    
-    for name in names:
-        rec_data += write_str8(name)
-        rec_data.append(0)
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_public_declaration_record(record):
-    rec_data = bytearray()
-    seg_id = record["seg_id"]
-    rec_data.append(seg_id)
-    for pn in record["public_names"]:
-        rec_data += pn["offset"].to_bytes(length=2, byteorder='little')
-        rec_data += write_str8(pn["name"])
-        rec_data.append(0)
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_line_numbers_record(record):
-    rec_data = bytearray()
-    seg_id = record["seg_id"]
-    rec_data.append(seg_id)
-    for lnum in record["line_numbers"]:
-        rec_data += lnum["offset"].to_bytes(length=2, byteorder='little')
-        rec_data += lnum["line_number"].to_bytes(length=2, byteorder='little')
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_content_record(record):
-    rec_data = bytearray()
-    rec_data.append(record["seg_id"])
-    rec_data += record["offset"].to_bytes(length=2, byteorder='little')
-    rec_data += record["dat"]
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_intersegment_references_record(record):
-    rec_data = bytearray()
-    rec_data.append(record["seg_id"])
-    rec_data.append(record["lo_hi_both"])
-    for offset in record["offsets"]:
-        rec_data += offset.to_bytes(length=2, byteorder='little')
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_relocation_record(record):
-    rec_data = bytearray()
-    rec_data.append(record["lo_hi_both"])
-    for offset in record["offsets"]:
-        rec_data += offset.to_bytes(length=2, byteorder='little')
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_external_references_record(record):
-    rec_data = bytearray()
-    rec_data.append(record["lo_hi_both"])
+# WRITE RECORDS
+# The writers append the payload of a record to a buffer; write_record
+# reserves the record header before it, then fills it in and appends the
+# checksum, so that a whole module is serialized into one buffer.
+def put_str8(out, name):
+    out.append(len(name))
+    out += name.encode('ascii')
+
+def put16_list(out, values):
+    out += struct.pack(f'<{len(values)}H', *values)
+
+def write_module_header_record(out, record):
+    put_str8(out, record["name"])
+    out += b'\0\0'
+    for seg_id, segment in record["segments"].items():
+        out += SEGMENT_DEFINITION.pack(seg_id, segment["seg_length"], segment["aln_typ"])
+
+# (offset, name) of symbols, read from the columns of a SymbolTable
+def symbol_pairs(symbols):
+    if isinstance(symbols, SymbolTable):
+        return zip(symbols.offsets, symbols.values)
+    return ((symbol["offset"], symbol["name"]) for symbol in symbols)
+
+def write_local_symbols_record(out, record):
+    out.append(record["seg_id"])
+    for offset, name in symbol_pairs(record["symbols"]):
+        out += U16.pack(offset)
+        put_str8(out, name)
+        out.append(0)
+
+def write_external_names_record(out, record):
+    for name in record["names"]:
+        put_str8(out, name)
+        out.append(0)
+
+def write_public_declaration_record(out, record):
+    out.append(record["seg_id"])
+    for offset, name in symbol_pairs(record["public_names"]):
+        out += U16.pack(offset)
+        put_str8(out, name)
+        out.append(0)
+
+def write_line_numbers_record(out, record):
+    out.append(record["seg_id"])
+    lnums = record["line_numbers"]
+    if isinstance(lnums, LineTable):
+        # the two columns interleaved
+        words = array('H', bytes(4 * len(lnums)))
+        words[0::2] = lnums.offsets
+        words[1::2] = lnums.values
+        if sys.byteorder != 'little':
+            words.byteswap()
+        out += words
+        return
+    words = []
+    for lnum in lnums:
+        words.append(lnum["offset"])
+        words.append(lnum["line_number"])
+    put16_list(out, words)
+
+def write_content_record(out, record):
+    out += CONTENT_HEADER.pack(record["seg_id"], record["offset"])
+    out += record["dat"]
+
+def write_intersegment_references_record(out, record):
+    out.append(record["seg_id"])
+    out.append(record["lo_hi_both"])
+    put16_list(out, record["offsets"])
+
+def write_relocation_record(out, record):
+    out.append(record["lo_hi_both"])
+    put16_list(out, record["offsets"])
+
+def write_external_references_record(out, record):
+    out.append(record["lo_hi_both"])
+    words = []
     for ref in record["references"]:
-        rec_data += ref["name_index"].to_bytes(length=2, byteorder='little')
-        rec_data += ref["offset"].to_bytes(length=2, byteorder='little')
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_module_end_record(record):
-    rec_data = bytearray()
-    rec_data.append(record["mod_typ"])
-    rec_data.append(record["seg_id"])
-    rec_data += record["offset"].to_bytes(length=2, byteorder='little')
-    for b in record["optional_info"]:
-        rec_data.append(b)
-    return mkrec(rec_data, record["rec_typ"])
-
-def write_named_common_definitions_record(record):
-    rec_data = bytearray()
+        words.append(ref["name_index"])
+        words.append(ref["offset"])
+    put16_list(out, words)
+
+def write_module_end_record(out, record):
+    out += MODULE_END.pack(record["mod_typ"], record["seg_id"], record["offset"])
+    out += bytes(record["optional_info"])
+
+def write_named_common_definitions_record(out, record):
     for cn in record["common_names"]:
-        rec_data.append(cn["seg_id"])
-        rec_data += write_str8(cn["common_name"])
-    return mkrec(rec_data, record["rec_typ"])
+        out.append(cn["seg_id"])
+        put_str8(out, cn["common_name"])
 
-def write_module_ancestor_record(record):
-    return mkrec(write_str8(record["module_name"]), record["rec_typ"])
+def write_module_ancestor_record(out, record):
+    put_str8(out, record["module_name"])
 
-def write_end_of_file_record(record):
-    return mkrec(b'', record["rec_typ"])
+def write_end_of_file_record(out, record):
+    pass
 
-def write_library_header_record(record):
-    rec_data = bytearray()
-    rec_data += record["module_count"].to_bytes(length=2, byteorder='little')
-    rec_data += record["block_number"].to_bytes(length=2, byteorder='little')
-    rec_data += record["byte_number"].to_bytes(length=2, byteorder='little')
-    return mkrec(rec_data, record["rec_typ"])
+def write_library_header_record(out, record):
+    out += LIBRARY_HEADER.pack(record["module_count"], record["block_number"],
+                                record["byte_number"])
 
-def write_library_module_names_record(record):
-    rec_data = bytearray()
+def write_library_module_names_record(out, record):
     for name in record["module_names"]:
-        rec_data += write_str8(name)
-    return mkrec(rec_data, record["rec_typ"])
+        put_str8(out, name)
 
-def write_library_module_locations_record(record):
-    rec_data = bytearray()
+def write_library_module_locations_record(out, record):
+    words = []
     for pair in record["pairs"]:
-        rec_data += pair["block_number"].to_bytes(length=2, byteorder='little')
-        rec_data += pair["byte_number"].to_bytes(length=2, byteorder='little')
-    return mkrec(rec_data, record["rec_typ"])
+        words.append(pair["block_number"])
+        words.append(pair["byte_number"])
+    put16_list(out, words)
 
-def write_library_dictionary_record(record):
-    rec_data = bytearray()
+def write_library_dictionary_record(out, record):
     for mgrp in record["module_groups"]:
         for name in mgrp:
-            rec_data += write_str8(name)
-        rec_data.append(0)
-    return mkrec(rec_data, record["rec_typ"])
-
-def record_to_bin(record):
+            put_str8(out, name)
+        out.append(0)
+
+record_writers = {
+    MODULE_HEADER_RECORD: write_module_header_record,
+    LOCAL_SYMBOLS_RECORD: write_local_symbols_record,
+    EXTERNAL_NAMES_RECORD: write_external_names_record,
+    PUBLIC_DECLARATION_RECORD: write_public_declaration_record,
+    LINE_NUMBERS_RECORD: write_line_numbers_record,
+    CONTENT_RECORD: write_content_record,
+    INTERSEGMENT_REFERENCES_RECORD: write_intersegment_references_record,
+    RELOCATION_RECORD: write_relocation_record,
+    EXTERNAL_REFERENCES_RECORD: write_external_references_record,
+    MODULE_END_RECORD: write_module_end_record,
+    NAMED_COMMON_DEFINITIONS_RECORD: write_named_common_definitions_record,
+    MODULE_ANCESTOR_RECORD: write_module_ancestor_record,
+    END_OF_FILE_RECORD: write_end_of_file_record,
+    LIBRARY_HEADER_RECORD: write_library_header_record,
+    LIBRARY_MODULE_NAMES_RECORD: write_library_module_names_record,
+    LIBRARY_MODULE_LOCATIONS_RECORD: write_library_module_locations_record,
+    LIBRARY_DICTIONARY_RECORD: write_library_dictionary_record,
+}
+
+# append the record, with its header and checksum, to out
+def write_record(out, record):
     type = record["rec_typ"]
-    if type == MODULE_HEADER_RECORD:
-        return write_module_header_record(record)
-    elif type == LOCAL_SYMBOLS_RECORD:
-        return write_local_symbols_record(record)
-    elif type == EXTERNAL_NAMES_RECORD:
-        return write_external_names_record(record)
-    elif type == PUBLIC_DECLARATION_RECORD:
-        return write_public_declaration_record(record)
-    elif type == LINE_NUMBERS_RECORD:
-        return write_line_numbers_record(record)
-    elif type == CONTENT_RECORD:
-        return write_content_record(record)
-    elif type == INTERSEGMENT_REFERENCES_RECORD:
-        return write_intersegment_references_record(record)
-    elif type == RELOCATION_RECORD:
-        return write_relocation_record(record)
-    elif type == EXTERNAL_REFERENCES_RECORD:
-        return write_external_references_record(record)
-    elif type == MODULE_END_RECORD:
-        return write_module_end_record(record)
-    elif type == NAMED_COMMON_DEFINITIONS_RECORD:
-        return write_named_common_definitions_record(record)
-    elif type == MODULE_ANCESTOR_RECORD:
-        return write_module_ancestor_record(record)
-    elif type == END_OF_FILE_RECORD:
-        return write_end_of_file_record(record)
-    elif type == LIBRARY_HEADER_RECORD:
-        return write_library_header_record(record)
-    elif type == LIBRARY_MODULE_NAMES_RECORD:
-        return write_library_module_names_record(record)
-    elif type == LIBRARY_MODULE_LOCATIONS_RECORD:
-        return write_library_module_locations_record(record)
-    elif type == LIBRARY_DICTIONARY_RECORD:
-        return write_library_dictionary_record(record)
-    else:
+    writer = record_writers.get(type)
+    if writer is None:
         print(f"omf80: record type not supported 0x{type:02x}")
         exit(0)
+    start = len(out)
+    out += RECORD_HEADER_SPACE
+    writer(out, record)
+    RECORD_HEADER.pack_into(out, start, type, len(out) - start - RECORD_HEADER.size + 1)
+    with memoryview(out) as view:
+        checksum = -sum(view[start:]) & 0xff
+    out.append(checksum)
+
+def record_to_bin(record):
+    out = bytearray()
+    write_record(out, record)
+    return out
 
 
 # bin_to_records
-def read_omf80(data):
-    records = []
-    i = 0
-    while i < len(data):
-        type = data[i]
-        length = read16(data[i+1:])
-        records.append(bin_to_record(data[i:i+length+3]))
-        i = i + length + 3
-    return records
+# decode the records one at a time, either from a buffer (bytes, bytearray,
+# mmap) through a single memoryview, starting at start, or from a binary
+# file object; a file object is read record by record, so fast is strict
+def iter_records(source, verify=VERIFY_STRICT, start=0):
+    if hasattr(source, "readinto"):
+        yield from iter_file_records(source, verify != VERIFY_OFF)
+        return
+    if verify == VERIFY_FAST:
+        verify_records(source, start)
+    check = verify == VERIFY_STRICT
+    with memoryview(source) as view:
+        i = start
+        end = len(view)
+        while i < end:
+            if i + 3 > end:
+                raise OMFError('truncated record header', i)
+            type, length = RECORD_HEADER.unpack_from(view, i)
+            if length == 0 or i + 3 + length > end:
+                raise OMFError('truncated record', i, type)
+            yield bin_to_record(view[i:i+length+3], check, i)
+            i = i + length + 3
+
+def iter_file_records(file, verify=True):
+    offset = 0
+    while True:
+        header = file.read(RECORD_HEADER.size)
+        if len(header) == 0:
+            return
+        if len(header) < RECORD_HEADER.size:
+            raise OMFError('truncated record header', offset)
+        type, length = RECORD_HEADER.unpack(header)
+        if length == 0:
+            raise OMFError('truncated record', offset, type)
+        data = bytearray(RECORD_HEADER.size + length)
+        data[0:RECORD_HEADER.size] = header
+        if file.readinto(memoryview(data)[RECORD_HEADER.size:]) != length:
+            raise OMFError('truncated record', offset, type)
+        yield bin_to_record(memoryview(data), verify, offset)
+        offset += len(data)
+
+# type and length of the record at offset in data, which must end before end
+def record_header_at(data, offset, end=None):
+    if end is None:
+        end = len(data)
+    if offset + RECORD_HEADER.size > end:
+        raise OMFError('truncated record header', offset)
+    type, length = RECORD_HEADER.unpack_from(data, offset)
+    if length == 0 or offset + RECORD_HEADER.size + length > end:
+        raise OMFError('truncated record', offset, type)
+    return type, length
+
+# the offsets of the records of data from start to end
+def record_offsets(data, start=0, end=None):
+    if end is None:
+        end = len(data)
+    offsets = []
+    i = start
+    while i < end:
+        type, length = record_header_at(data, i, end)
+        offsets.append(i)
+        i += RECORD_HEADER.size + length
+    return offsets
+
+# check the checksums of all the records of data from start to end: with
+# numpy, the bytes of each record are summed modulo 256 in a single call
+def verify_records(data, start=0, end=None):
+    if end is None:
+        end = len(data)
+    offsets = record_offsets(data, start, end)
+    if len(offsets) == 0:
+        return
+    # imported here, the other modes do not pay for it
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        buffer = numpy.frombuffer(data, dtype=numpy.uint8, count=end - start, offset=start)
+        sums = numpy.add.reduceat(buffer, numpy.array(offsets) - start)
+        bad = numpy.flatnonzero(sums & 0xff)
+        del buffer
+        if len(bad) > 0:
+            offset = offsets[bad[0]]
+            raise ChecksumError('bad checksum', offset, data[offset])
+        return
+    with memoryview(data) as view:
+        for offset, next_offset in zip(offsets, offsets[1:] + [end]):
+            if not check_ok(view[offset:next_offset]):
+                raise ChecksumError('bad checksum', offset, view[offset])
+
+def read_omf80(data, verify=VERIFY_STRICT):
+    return list(iter_records(data, verify))
 bin_to_records = read_omf80
 
 def records_to_bin(records):
-    bin_data = bytearray()
+    out = bytearray()
+    for record in records:
+        write_record(out, record)
+    return out
+
+# write the records to a binary file object, chunk_size bytes at a time
+def write_omf80(records, file, chunk_size=0x10000):
+    out = bytearray()
     for record in records:
-        rec_bin = record_to_bin(record)
-        bin_data += rec_bin
-    return bin_data
+        write_record(out, record)
+        if len(out) >= chunk_size:
+            file.write(out)
+            del out[:]
+    if len(out) > 0:
+        file.write(out)
 
 def is_module(records):
     record = records[0]
@@ -752,45 +1199,39 @@ def records_to_library(records):
     return library
 
 def make_module_header_record(module):
-    record = {}
-    record["rec_typ"] = MODULE_HEADER_RECORD
+    record = ModuleHeaderRecord()
     record["name"] = module["name"]
     record["segments"] = module["segments"].copy()
     return record
 
 def make_module_named_common_definitions_record(module):
-    record = {}
-    record["rec_typ"] = NAMED_COMMON_DEFINITIONS_RECORD
-    record["comon_names"] = module["common_names"].copy()
+    record = NamedCommonDefinitionsRecord()
+    record["common_names"] = module["common_names"].copy()
     return record
 
 def make_external_names_record(module):
-    record = {}
-    record["rec_typ"] = EXTERNAL_NAMES_RECORD
+    record = ExternalNamesRecord()
     record["names"] = module["external_names"].copy()
     return record
 
 def make_public_declarations_records(module):
     records = []
     for seg_id, pub_decl in module["public_declarations"].items():
-        record = {}
-        record["rec_typ"] = PUBLIC_DECLARATION_RECORD
+        record = PublicDeclarationRecord()
         record["seg_id"] = seg_id
         record["public_names"] = pub_decl.copy()
         records.append(record)
     return records
 
 def make_module_ancestor_record(debug_info):
-    record = {}
-    record["rec_typ"] = MODULE_ANCESTOR_RECORD
+    record = ModuleAncestorRecord()
     record["module_name"] = debug_info["ancestor_name"]
     return record
 
 def make_module_local_symbols_records(debug_info):
     records = []
     for seg_id, loc_syms in debug_info.get("local_symbols", {}).items():
-        record = {}
-        record["rec_typ"] = LOCAL_SYMBOLS_RECORD
+        record = LocalSymbolsRecord()
         record["seg_id"] = seg_id
         record["symbols"] = loc_syms
         records.append(record)
@@ -799,16 +1240,14 @@ def make_module_local_symbols_records(debug_info):
 def make_module_line_numbers_records(debug_info):
     records = []
     for seg_id, lnums in debug_info.get("line_numbers", {}).items():
-        record = {}
-        record["rec_typ"] = LINE_NUMBERS_RECORD
+        record = LineNumbersRecord()
         record["seg_id"] = seg_id
         record["line_numbers"] = lnums
         records.append(record)
     return records
 
 def make_content_record(cdef):
-    record = {}
-    record["rec_typ"] = CONTENT_RECORD
+    record = ContentRecord()
     record["seg_id"] = cdef["seg_id"]
     record["offset"] = cdef["offset"]
     record["dat"] = cdef["data"]
@@ -817,28 +1256,25 @@ def make_content_record(cdef):
 def make_intersegment_refernces_records(cdef):
     records = []
     for (seg_id,lo_hi_both), offsets in cdef["internal"].items():
-        record = {}
-        record["rec_typ"] = INTERSEGMENT_REFERENCES_RECORD
+        record = IntersegmentReferencesRecord()
         record["seg_id"] = seg_id
         record["lo_hi_both"] = lo_hi_both
         record["offsets"] = offsets
         records.append(record)
     return records
 
-def make_external_references_record(cdef, exdict):
+def make_external_references_records(cdef, exdict):
     records = []
     for lhb, exts in cdef["external"].items():
-        record = {}
-        record["rec_typ"] = EXTERNAL_REFERENCES_RECORD
+        record = ExternalReferencesRecord()
         record["lo_hi_both"] = lhb
-        f = lambda x : {"name_index" : exdict[x["name"]], "offset" : x["offset"]}
+        f = lambda x : ExternalReference(exdict[x["name"]], x["offset"])
         record["references"] = list(map(f, exts))
         records.append(record)
     return records
 
 def make_module_end_record(module):
-    record = {}
-    record["rec_typ"] = MODULE_END_RECORD
+    record = ModuleEndRecord()
     record["mod_typ"] = 1 if module["is_main"] else 0
     record["seg_id"] = 1
     record["offset"] = 0
@@ -874,229 +1310,440 @@ def module_to_records(module):
     records.append(make_module_end_record(module))
     return records
 
+# LIBRARY WRITER
+# A library is written as ISIS LIB writes it: the LIBRARY HEADER record, the
+# modules one after the other, then the MODULE NAMES, MODULE LOCATIONS and
+# DICTIONARY records.  The header points to the module names record and the
+# locations point to each module, as a 128-byte block number and a byte
+# number in the block.
+LIBRARY_HEADER_SIZE = RECORD_HEADER.size + 6 + 1
+
+def block_byte(offset):
+    block_number, byte_number = divmod(offset, 128)
+    return block_number, byte_number
+
+# the header and the records following the modules of a library whose
+# modules start at offsets and end at end
+def library_directory_records(members, offsets, end):
+    block_number, byte_number = block_byte(end)
+    header = LibraryHeaderRecord(module_count=len(members),
+                    block_number=block_number, byte_number=byte_number)
+    names = LibraryModuleNamesRecord(module_names=[member['name'] for member in members])
+    locations = LibraryModuleLocationsRecord(
+                    pairs=[ModuleLocation(*block_byte(offset)) for offset in offsets])
+    dictionary = LibraryDictionaryRecord(
+                    module_groups=[list(member['public_names']) for member in members])
+    return header, [names, locations, dictionary]
+
+def library_members_to_bin(members):
+    offsets = []
+    offset = LIBRARY_HEADER_SIZE
+    for member in members:
+        offsets.append(offset)
+        offset += len(member['data'])
+    header, directory = library_directory_records(members, offsets, offset)
+    result = record_to_bin(header)
+    for member in members:
+        result += member['data']
+    result += records_to_bin(directory + [EndOfFileRecord()])
+    return result
+
+# records, when given, are the records of module, already made
+def module_to_library_member(module, records=None):
+    if records is None:
+        records = module_to_records(module)
+    return LibraryMember(module['name'], list(public_names_of(module)),
+                records_to_bin(records))
+
+def library_to_bin(library):
+    return library_members_to_bin([module_to_library_member(module)
+                                        for module in library["modules"]])
+
 def library_to_records(library):
     records = []
+    members = []
+    offsets = []
+    offset = LIBRARY_HEADER_SIZE
     for module in library["modules"]:
-        records += module_to_records(module)
-    return records
+        module_records = module_to_records(module)
+        member = module_to_library_member(module, module_records)
+        offsets.append(offset)
+        offset += len(member['data'])
+        records += module_records
+        members.append(member)
+    header, directory = library_directory_records(members, offsets, offset)
+    return [header] + records + directory
 
 def records_to_module(records):
     module = {'type': 'MODULE'}
     assert len(records) > 0
     assert records[0]["rec_typ"] == MODULE_HEADER_RECORD
     assert records[-1]["rec_typ"] == MODULE_END_RECORD
+    # the records and their entries are read through their attributes
     cdef = None
     for record in records:
-        type = record["rec_typ"]
+        type = record.rec_typ
         if type == MODULE_HEADER_RECORD:
-            module["name"] = record["name"]
-            module["segments"] = record["segments"].copy()
+            module["name"] = record.name
+            module["segments"] = record.segments.copy()
         elif type == MODULE_END_RECORD:
-            module["is_main"] = record["mod_typ"] == 1
+            module["is_main"] = record.mod_typ == 1
         elif type == NAMED_COMMON_DEFINITIONS_RECORD:
-            module["common_names"] = record["common_names"].copy()
+            module["common_names"] = record.common_names.copy()
         elif type == EXTERNAL_NAMES_RECORD:
-            module["external_names"] = record["names"].copy()
+            module["external_names"] = record.names.copy()
         elif type == PUBLIC_DECLARATION_RECORD:
-            seg_id = record["seg_id"]
             pub_decls = module.setdefault("public_declarations", {})
-            pub_decl_seg = pub_decls.setdefault(seg_id, [])
-            for pn in record["public_names"]:
-                pub_decl_seg.append({"name": pn["name"], "offset" : pn["offset"]})
-            pub_decl_seg.sort(key = lambda x : x["offset"])
+            pub_decl_seg = pub_decls.setdefault(record.seg_id, SymbolTable())
+            pub_decl_seg.extend(record.public_names)
         elif type == MODULE_ANCESTOR_RECORD:
             debug_info = {}
             module.setdefault("debug_info", []).append(debug_info)
-            debug_info["ancestor_name"] = record["module_name"]
+            debug_info["ancestor_name"] = record.module_name
         elif type == LOCAL_SYMBOLS_RECORD:
             debug_info = module.setdefault("debug_info", [{}])[-1]
-            seg_id = record["seg_id"]
             loc_syms = debug_info.setdefault("local_symbols", {})
-            loc_sym_seg = loc_syms.setdefault(seg_id, [])
-            for sym in record["symbols"]:
-                loc_sym_seg.append({"name": sym["name"], "offset": sym["offset"]})
-            loc_sym_seg.sort(key = lambda x : x["offset"])
+            loc_sym_seg = loc_syms.setdefault(record.seg_id, SymbolTable())
+            loc_sym_seg.extend(record.symbols)
         elif type == LINE_NUMBERS_RECORD:
             debug_info = module.setdefault("debug_info", [{}])[-1]
-            seg_id = record["seg_id"]
             lns = debug_info.setdefault("line_numbers", {})
-            ln_seg = lns.setdefault(seg_id, [])
-            for ln in record["line_numbers"]:
-                ln_seg.append({"line_number": ln["line_number"], "offset": ln["offset"]})
-            ln_seg.sort(key = lambda x : x["offset"])
+            ln_seg = lns.setdefault(record.seg_id, LineTable())
+            ln_seg.extend(record.line_numbers)
         elif type == CONTENT_RECORD:
-            cdef = {}
-            cdef["seg_id"] = record["seg_id"]
-            cdef["offset"] = record["offset"]
-            cdef["data"] = record["dat"]
+            cdef = ContentDefinition(record.seg_id, record.offset, record.dat)
             cdefs = module.setdefault("content_definitions", [])
             cdefs.append(cdef)
         elif type == RELOCATION_RECORD:
-            lhb = record["lo_hi_both"]
             internal = cdef.setdefault("internal", {})
-            for offs in record["offsets"]:
-                seg = cdef["seg_id"]
-                offlst = internal.setdefault((seg,lhb), [])
-                offlst.append(offs)
+            internal.setdefault((cdef.seg_id, record.lo_hi_both), []).extend(record.offsets)
         elif type == INTERSEGMENT_REFERENCES_RECORD:
-            seg = record["seg_id"]
-            lhb = record["lo_hi_both"]
             internal = cdef.setdefault("internal", {})
-            intseg = internal.setdefault((seg, lhb), [])
-            for offs in record["offsets"]:
-                intseg.append(offs)
+            internal.setdefault((record.seg_id, record.lo_hi_both), []).extend(record.offsets)
         elif type == EXTERNAL_REFERENCES_RECORD:
-            lhb = record["lo_hi_both"]
             external = cdef.setdefault("external", {})
-            exts = external.setdefault(lhb, [])
-            for ext in record["references"]:
-                name_index = ext["name_index"]
-                name = module["external_names"][name_index]
-                offs = ext["offset"]
-                exts.append({"name": name, "offset": offs})
-            exts.sort(key = lambda x : x["offset"])
+            exts = external.setdefault(record.lo_hi_both, [])
+            names = module["external_names"]
+            for ext in record.references:
+                exts.append(Symbol(names[ext.name_index], ext.offset))
         else:
             error(f"unknown type: 0x{type:02x}")
+    sort_tables(module)
     return module
 
-def add16(data, offset, num):
-    old = int.from_bytes(data[offset:offset+2], byteorder='little')
-    new = old + num
-    data[offset:offset+2] = new.to_bytes(length=2, byteorder='little')
-
-# link modules only one module
-def link_modules(modules):
-
-    def get_offset(seg_id, code_offset, data_offset):
-        if seg_id == ABSOLUTE_SEGMENT:
-            return 0
-        if seg_id == CODE_SEGMENT:
-            return code_offset
-        if seg_id == DATA_SEGMENT:
-            return data_offset
-        if seg_id == STACK_SEGMENT:
-            return data_offset
-        if seg_id == MEMORY_SEGMENT:
-            return 0
-        error(f'link: unknown segment: {seg_id}')
+# sort the symbol and line number tables and the external references of a
+# module once it is complete, rather than after each record
+def sort_tables(module):
+    for table in module.get("public_declarations", {}).values():
+        table.sort()
+    for cdef in module.get("content_definitions", []):
+        for exts in cdef.get("external", {}).values():
+            exts.sort(key = lambda x : x.offset)
+    for debug_info in module.get("debug_info", []):
+        for table in debug_info.get("local_symbols", {}).values():
+            table.sort()
+        for table in debug_info.get("line_numbers", {}).values():
+            table.sort()
+
+# RELOCATION FIXUPS
+# lo_hi_both of the relocation, inter-segment and external references
+LOW_BYTE = 1
+HIGH_BYTE = 2
+BOTH_BYTES = 3
+
+# below this number of fixups, setting up the 16-bit views costs more than
+# it saves
+WORD_VIEW_FIXUPS = 12
+
+# add value to the references at offsets in data, the content of a content
+# definition starting at base: to the 16-bit words for BOTH_BYTES, to the
+# single bytes for LOW_BYTE and HIGH_BYTE (adding the low or the high byte
+# of value); all the sums wrap around
+def apply_fixups(data, offsets, value, lo_hi_both=BOTH_BYTES, base=0):
+    if len(offsets) == 0:
+        return
+    if lo_hi_both == LOW_BYTE:
+        add8_all(data, offsets, value & 0xff, base)
+    elif lo_hi_both == HIGH_BYTE:
+        add8_all(data, offsets, (value >> 8) & 0xff, base)
+    elif sys.byteorder == 'little' and len(offsets) >= WORD_VIEW_FIXUPS:
+        add16_words(data, offsets, value, base)
+    else:
+        add16_all(data, offsets, value, base)
 
-    module = {'type': 'MODULE'}
+def add8_all(data, offsets, value, base):
+    for offset in offsets:
+        i = offset - base
+        data[i] = (data[i] + value) & 0xff
 
+def add16_all(data, offsets, value, base):
+    for offset in offsets:
+        i = offset - base
+        U16.pack_into(data, i, (U16.unpack_from(data, i)[0] + value) & 0xffff)
+
+# the words at even and at odd positions are patched through two 16-bit
+# views of data (little endian hosts only)
+def add16_words(data, offsets, value, base):
+    with memoryview(data) as view:
+        end = len(view) // 2 * 2
+        with view[0:end].cast('H') as even, \
+                view[1:1 + (len(view) - 1) // 2 * 2].cast('H') as odd:
+            for offset in offsets:
+                i = offset - base
+                words = odd if i & 1 else even
+                i >>= 1
+                words[i] = (words[i] + value) & 0xffff
+
+# GLOBAL SYMBOLS
+# The public symbols of the modules of a link, by name: the module defining
+# each one (its index in the link), its segment and its value.  Modules are
+# added one after the other; the names they refer to and that no module
+# added so far defines are kept, in order, in undefined.  A later definition
+# of a name replaces the earlier one.
+class GlobalSymbol(Fields):
+    __slots__ = ("module", "seg_id", "value")
+
+    def __init__(self, module, seg_id, value):
+        self.module = module
+        self.seg_id = seg_id
+        self.value = value
+
+class GlobalSymbols:
+    __slots__ = ("symbols", "undefined")
+
+    def __init__(self):
+        self.symbols = {}
+        self.undefined = {}
+
+    def define(self, name, module, seg_id, value):
+        name = sys.intern(name)
+        self.symbols[name] = GlobalSymbol(module, seg_id, value)
+        self.undefined.pop(name, None)
+
+    # the publics of a module, then its externals
+    def add_module(self, module, index=None):
+        symbols = self.symbols
+        undefined = self.undefined
+        for seg_id, name, offset in public_symbols(module):
+            name = sys.intern(name)
+            symbols[name] = GlobalSymbol(index, seg_id, offset)
+            undefined.pop(name, None)
+        for name in module.get('external_names', ()):
+            if name not in symbols:
+                undefined.setdefault(sys.intern(name), index)
+
+    def get(self, name, default=None):
+        return self.symbols.get(name, default)
+
+    def __getitem__(self, name):
+        return self.symbols[name]
+
+    def __contains__(self, name):
+        return name in self.symbols
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+# (seg_id, name, offset) of the public declarations of a module
+def public_symbols(module):
+    for seg_id, pub_decl in module.get('public_declarations', {}).items():
+        if isinstance(pub_decl, SymbolTable):
+            for offset, name in zip(pub_decl.offsets, pub_decl.values):
+                yield seg_id, name, offset
+        else:
+            for pd in pub_decl:
+                yield seg_id, pd['name'], pd['offset']
+
+# offset of the segment seg_id of a module whose code and data segments
+# start at code_offset and data_offset in the linked module
+def segment_offset(seg_id, code_offset, data_offset):
+    if seg_id == ABSOLUTE_SEGMENT:
+        return 0
+    if seg_id == CODE_SEGMENT:
+        return code_offset
+    if seg_id == DATA_SEGMENT:
+        return data_offset
+    if seg_id == STACK_SEGMENT:
+        return data_offset
+    if seg_id == MEMORY_SEGMENT:
+        return 0
+    error(f'link: unknown segment: {seg_id}')
+
+# offsets of the code and data segments of each module in the link
+def module_bases(modules):
+    bases = []
     code_offset = 0
     data_offset = 0
+    for mod in modules:
+        bases.append((code_offset, data_offset))
+        code_offset += mod["segments"][CODE_SEGMENT]["seg_length"]
+        data_offset += mod["segments"][DATA_SEGMENT]["seg_length"]
+    # the segment lengths are 16-bit
+    if code_offset > 0xffff:
+        error(f'link: code segment of 0x{code_offset:x} bytes, past 0xffff')
+    if data_offset > 0xffff:
+        error(f'link: data segment of 0x{data_offset:x} bytes, past 0xffff')
+    return bases
+
+# the part of one module in a link: its public declarations, content
+# definitions and debug info relocated to code_offset and data_offset;
+# its external references are resolved by link_parts
+def relocate_module(mod, code_offset, data_offset):
+    part = {'name': mod['name'], 'is_main': mod['is_main'], 'segments': mod['segments']}
+
+    # public declarations
+    publics = part.setdefault('publics', [])
+    for seg_id, name, offset in public_symbols(mod):
+        offset1 = offset + segment_offset(seg_id, code_offset, data_offset)
+        if offset1 > 0xffff:
+            error(f'link: public {name} of {mod["name"]} at 0x{offset1:x}, past 0xffff')
+        publics.append((seg_id, name, offset1))
+
+    # content definitions
+    cdefs = part.setdefault('content_definitions', [])
+    for cdef0 in mod["content_definitions"]:
+        seg_id0 = cdef0.seg_id
+        cdef_offset0 = cdef0.offset
+        cdef_delta = segment_offset(seg_id0, code_offset, data_offset)
+        data1 = cdef0.data.copy()
+        cdef1 = ContentDefinition(seg_id0, cdef_offset0 + cdef_delta, data1)
+        internal0 = getattr(cdef0, 'internal', None)
+        if internal0 is not None:
+            internal1 = {}
+            for (seg_id, lhb), offsets0 in internal0.items():
+                offsets1 = [offset0 + cdef_delta for offset0 in offsets0]
+                apply_fixups(data1, offsets0, segment_offset(seg_id, code_offset, data_offset),
+                                lhb, cdef_offset0)
+                internal1[(seg_id, lhb)] = offsets1
+            cdef1.internal = internal1
+        external0 = getattr(cdef0, 'external', None)
+        if external0 is not None:
+            external1 = {}
+            for lhb, exts0 in external0.items():
+                external1[lhb] = [Symbol(ext.name, ext.offset + cdef_delta) for ext in exts0]
+            cdef1.external = external1
+        cdefs.append(cdef1)
+
+    # debug info
+    debug_infos = part.setdefault('debug_info', [])
+    for debug_info0 in mod.get('debug_info', []):
+        debug_info1 = {}
+        debug_info1['ancestor_name'] = mod['name']
+        if 'line_numbers' in debug_info0:
+            line_numbers0 = debug_info0['line_numbers']
+            line_numbers1 = debug_info1.setdefault('line_numbers', {})
+            for seg_id, lnums0 in line_numbers0.items():
+                lnums1 = line_numbers1.setdefault(seg_id, LineTable())
+                delta = segment_offset(seg_id, code_offset, data_offset)
+                lnums1.extend_columns(relocated_offsets(lnums0.offsets, delta,
+                                            f'line numbers of {mod["name"]}'), lnums0.values)
+        if 'local_symbols' in debug_info0:
+            local_symbols0 = debug_info0['local_symbols']
+            local_symbols1 = debug_info1.setdefault('local_symbols', {})
+            for seg_id, lsyms0 in local_symbols0.items():
+                lsyms1 = local_symbols1.setdefault(seg_id, SymbolTable())
+                delta = segment_offset(seg_id, code_offset, data_offset)
+                lsyms1.extend_columns(relocated_offsets(lsyms0.offsets, delta,
+                                            f'local symbols of {mod["name"]}'), lsyms0.values)
+        debug_infos.append(debug_info1)
+    return part
+
+# the offsets of a table moved by delta; the tables hold 16-bit offsets
+def relocated_offsets(offsets, delta, what):
+    if len(offsets) > 0 and max(offsets) + delta > 0xffff:
+        error(f'link: {what} at 0x{max(offsets) + delta:x}, past 0xffff')
+    return array('H', [offset + delta for offset in offsets])
+
+# link modules only one module
+def link_modules(modules):
+    parts = []
+    for mod, (code_offset, data_offset) in zip(modules, module_bases(modules)):
+        parts.append(relocate_module(mod, code_offset, data_offset))
+    return link_parts(parts)
+
+# build the linked module from the parts of its modules and resolve the
+# external references; the references resolved in the content definitions
+# of a part are kept in its 'fixups' as (cdef index, lhb, name, offsets)
+def link_parts(parts):
+    module = {'type': 'MODULE'}
     module['name'] = None
     module['is_main'] = False
-    msegs = module.setdefault("segments", {})
+    msegs = {}
     cdefs = module.setdefault("content_definitions", [])
-    pub = {}
-    for mod in modules:
+    pub = GlobalSymbols()
+    for k, part in enumerate(parts):
 
         # segments
-        for seg_id, seg in mod["segments"].items():
-            mseg = msegs.setdefault(seg_id, {})
-            mseg['aln_typ'] = mseg.get('aln_typ', seg['aln_typ'])
-            mseg['seg_length'] = seg['seg_length'] + mseg.get('seg_length', 0)
-        module["segments"] = {id: seg for id, seg in msegs.items() if seg['seg_length'] > 0}
+        for seg_id, seg in part["segments"].items():
+            mseg = msegs.get(seg_id)
+            if mseg is None:
+                mseg = msegs[seg_id] = Segment(0, seg.aln_typ)
+            mseg.seg_length += seg.seg_length
 
         # is_main
-        module['is_main'] = module['is_main'] or mod['is_main']
+        module['is_main'] = module['is_main'] or part['is_main']
 
         # name
-        if mod['is_main']:
-            module['name'] = mod['name']
+        if part['is_main']:
+            module['name'] = part['name']
 
         # public declarations
         pub_decls = module.setdefault('public_declarations', {})
-        for seg_id, pub_decl in mod["public_declarations"].items():
-            pdlist = pub_decls.setdefault(seg_id, [])
-            for pd in pub_decl:
-                offset = pd['offset'] + get_offset(seg_id, code_offset, data_offset)
-                name = pd['name']
-                pdlist.append({'name': name, 'offset': offset})
-                pub[name] = {'seg_id': seg_id, 'value': offset}
-    
+        for seg_id, name, offset in part['publics']:
+            pdlist = pub_decls.get(seg_id)
+            if pdlist is None:
+                pdlist = pub_decls[seg_id] = SymbolTable()
+            pdlist.add(offset, name)
+            pub.define(name, k, seg_id, offset)
+
         # content definitions
-        for cdef0 in mod["content_definitions"]:
-            cdef1 = {}
-            seg_id0 = cdef0['seg_id']
-            cdef1['seg_id'] = seg_id0
-            cdef_offset0 = cdef0['offset']
-            cdef1['offset'] = cdef_offset0 + get_offset(seg_id0, code_offset, data_offset)
-            data1 = cdef0['data'].copy()
-            cdef1['data'] = data1
-            if 'internal' in cdef0:
-                internal0 = cdef0['internal']
-                internal1 = {}
-                for (seg_id, lhb), offsets0 in internal0.items():
-                    offsets1 = []
-                    for offset0 in offsets0:
-                        offsets1.append(offset0 + get_offset(seg_id0, code_offset, data_offset))
-                        i = offset0 - cdef_offset0
-                        add16(data1, i, get_offset(seg_id, code_offset, data_offset))
-                    internal1[(seg_id, lhb)] = offsets1
-                cdef1['internal'] = internal1
-            if 'external' in cdef0:
-                external0 = cdef0['external']
-                external1 = cdef1.setdefault('external', {})
-                for lhb, exts0 in external0.items():
-                    exts1 = external1.setdefault(lhb, [])
-                    for ext in exts0:
-                        name = ext["name"]
-                        offset = ext["offset"] + get_offset(seg_id0, code_offset, data_offset)
-                        exts1.append({'name': name, 'offset': offset})
-            module["content_definitions"].append(cdef1)
-                
-        # debug info
-        if 'debug_info' in mod:
-            for debug_info0 in mod['debug_info']:
-                debug_info1 = {}
-                debug_info1['ancestor_name'] = mod['name']
-                if 'line_numbers' in debug_info0:
-                    line_numbers0 = debug_info0['line_numbers']
-                    line_numbers1 = debug_info1.setdefault('line_numbers', {})
-                    for seg_id, lnums0 in line_numbers0.items():
-                        lnums1 = line_numbers1.setdefault(seg_id, [])
-                        for lnum0 in lnums0:
-                            offset1 = lnum0['offset'] + get_offset(seg_id, code_offset, data_offset)
-                            lnums1.append({'line_number': lnum0['line_number'], 'offset': offset1})
-                if 'local_symbols' in debug_info0:
-                    local_symbols0 = debug_info0['local_symbols']
-                    local_symbols1 = debug_info1.setdefault('local_symbols', {})
-                    for seg_id, lsyms0 in local_symbols0.items():
-                        lsyms1 = local_symbols1.setdefault(seg_id, [])
-                        for lsym0 in lsyms0:
-                            offset1 = lsym0['offset'] + get_offset(seg_id, code_offset, data_offset)
-                            lsyms1.append({'name': lsym0['name'], 'offset': offset1})
-                module['debug_info'] = module.get('debug_info', []) + [debug_info1]
+        cdefs.extend(part['content_definitions'])
 
-        code_offset += mod["segments"][CODE_SEGMENT]["seg_length"]
-        data_offset += mod["segments"][DATA_SEGMENT]["seg_length"]
+        # debug info
+        if len(part['debug_info']) > 0:
+            module.setdefault('debug_info', []).extend(part['debug_info'])
+    module["segments"] = {id: seg for id, seg in msegs.items() if seg.seg_length > 0}
 
     # resolve external
-    for cdef in module["content_definitions"]:
-        data = cdef['data']
-        cdef_offset = cdef['offset']
-        if 'external' in cdef:
-            for lhb, exts in cdef['external'].items():
-                for ext in exts:
-                    name = ext['name']
-                    offset = ext['offset']
-                    if name in pub:
-                        pu = pub[name]
-                        seg_id = pu['seg_id']
-                        add16(data, offset - cdef_offset, pu['value'])
-                        k = (seg_id, lhb)
-                        if seg_id != ABSOLUTE_SEGMENT:
-                            internal = cdef.setdefault('internal', {})
-                            if k in internal:
-                                internal[k].append(ext['offset'])
-                            else:
-                                internal[k] = [ext['offset']]
-                    else:
-                        error(f'unresolved external {name}')
-            del cdef['external']
+    for part in parts:
+        part_fixups = part.setdefault('fixups', [])
+        for index, cdef in enumerate(part['content_definitions']):
+            if hasattr(cdef, 'external'):
+                part_fixups += resolve_externals(cdef, pub, index)
+    sort_tables(module)
     return module
 
+# patch the external references of cdef with the values of the publics in
+# pub, turning them into internal references; return the fixups done
+def resolve_externals(cdef, pub, index=None):
+    data = cdef.data
+    cdef_offset = cdef.offset
+    symbols = pub.symbols
+    done = []
+    for lhb, exts in cdef.external.items():
+        # the references to each name are patched together
+        fixups = {}
+        for ext in exts:
+            name = ext.name
+            offset = ext.offset
+            pu = symbols.get(name)
+            if pu is not None:
+                seg_id = pu.seg_id
+                fixups.setdefault(name, []).append(offset)
+                if seg_id != ABSOLUTE_SEGMENT:
+                    internal = cdef.setdefault('internal', {})
+                    internal.setdefault((seg_id, lhb), []).append(offset)
+            else:
+                error(f'unresolved external {name}')
+        for name, offsets in fixups.items():
+            apply_fixups(data, offsets, symbols[name].value, lhb, cdef_offset)
+            done.append((index, lhb, name, offsets))
+    del cdef.external
+    return done
+
 # convert a list of records to a module or library
 def read_records(records):
     if is_module(records):
@@ -1106,45 +1753,615 @@ def read_records(records):
         library = records_to_library(records)
         return library
     error("unknown records")
-    
 
-# link modules and libraries
-def link(lst):
+# position in the file of a library module or record, as block/byte numbers
+def block_byte_offset(block_number, byte_number):
+    return block_number * 128 + byte_number
+
+# records of the module starting at offset in data, up to its MODULE END
+def read_module_at(data, offset, verify=VERIFY_STRICT):
+    if verify == VERIFY_FAST:
+        verify_records(data, offset, module_end(data, offset))
+        verify = VERIFY_OFF
+    records = []
+    for record in iter_records(data, verify, offset):
+        records.append(record)
+        if record["rec_typ"] == MODULE_END_RECORD:
+            break
+    return records
+
+# the modules of a library, decoded from the file buffer when first used;
+# when the buffer is the mapped file filename, a pickled copy maps the file
+# again instead of carrying its contents
+class LibraryModules:
+
+    def __init__(self, data, locations, filename=None, verify=VERIFY_STRICT):
+        self.data = data
+        self.locations = locations
+        self.filename = filename
+        self.verify = verify
+        self.modules = {}
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __getitem__(self, index):
+        module = self.modules.get(index)
+        if module is None:
+            if self.data is None:
+                self.data = map_file(self.filename)
+            records = read_module_at(self.data, self.locations[index], self.verify)
+            module = records_to_module(records)
+            self.modules[index] = module
+        return module
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __reduce__(self):
+        data = None if self.filename is not None else bytes(self.data)
+        return (LibraryModules, (data, self.locations, self.filename, self.verify),
+                    {'modules': self.modules})
+
+# read a library reading only its header, module names, module locations
+# and dictionary; the modules themselves are decoded on demand
+def read_library(data, filename=None, verify=VERIFY_STRICT):
+    check = verify != VERIFY_OFF
+    with memoryview(data) as view:
+        type, length = record_header_at(view, 0)
+        header = bin_to_record(view[0:length+3], check, 0)
+        i = block_byte_offset(header["block_number"], header["byte_number"])
+        index = {}
+        while i < len(view):
+            if view[i] not in (LIBRARY_MODULE_NAMES_RECORD,
+                    LIBRARY_MODULE_LOCATIONS_RECORD, LIBRARY_DICTIONARY_RECORD):
+                break
+            type, length = record_header_at(view, i)
+            index[type] = bin_to_record(view[i:i+length+3], check, i)
+            i = i + length + 3
+    if LIBRARY_MODULE_LOCATIONS_RECORD not in index or \
+            LIBRARY_DICTIONARY_RECORD not in index:
+        # no usable index: decode the whole library
+        records = read_omf80(data, verify)
+        return records_to_library(records[:-1])
+    library = {'type': 'LIBRARY'}
+    pairs = index[LIBRARY_MODULE_LOCATIONS_RECORD]["pairs"]
+    locations = [block_byte_offset(pair["block_number"], pair["byte_number"])
+                    for pair in pairs]
+    library["modules"] = LibraryModules(data, locations, filename, verify)
+    dictionary = {}
+    module_groups = index[LIBRARY_DICTIONARY_RECORD]["module_groups"]
+    for i in range(len(module_groups)):
+        for name in module_groups[i]:
+            dictionary[name] = i
+    library["dictionary"] = dictionary
+    return library
+
+# offset just after the MODULE END record of the module at offset in data
+def module_end(data, offset):
+    while offset + RECORD_HEADER.size <= len(data):
+        type, length = record_header_at(data, offset)
+        offset += RECORD_HEADER.size + length
+        if type == MODULE_END_RECORD:
+            return offset
+    raise OMFError('module without MODULE END record', offset)
+
+# the modules of a module or library file as library members, their
+# records kept as they are in data
+def read_library_members(data):
+    if data[0] != LIBRARY_HEADER_RECORD:
+        module = read_object(data)
+        return [LibraryMember(module['name'], list(public_names_of(module)),
+                    bytes(data[:module_end(data, 0)]))]
+    library = read_library(data)
+    if not isinstance(library['modules'], LibraryModules):
+        error('library without module locations or dictionary')
+    public_names = [[] for location in library['modules'].locations]
+    for name, index in library['dictionary'].items():
+        public_names[index].append(name)
+    members = []
+    for location, names in zip(library['modules'].locations, public_names):
+        end = module_end(data, location)
+        type, length = record_header_at(data, location)
+        header = bin_to_record(data[location:location+length+3], offset=location)
+        members.append(LibraryMember(header['name'], names, bytes(data[location:end])))
+    return members
+
+# read a module or a library from a buffer, the contents of filename
+def read_object(data, filename=None, verify=VERIFY_STRICT):
+    if data[0] == LIBRARY_HEADER_RECORD:
+        return read_library(data, filename, verify)
+    records = read_omf80(data, verify)
+    if records[-1]['rec_typ'] != END_OF_FILE_RECORD:
+        raise OMFError('missing END OF FILE record', len(data))
+    return read_records(records[:-1])
+
+# load a module or a library from a file; a library keeps the file
+# mapped so that its modules can be decoded when needed, a library with an
+# index is read through it
+# with a cache, a file whose contents were already parsed is not parsed again
+def load_object(filename, cache=None, verify=VERIFY_STRICT):
+    library = load_indexed_library(filename, verify)
+    if library is not None:
+        return library
+    data = map_file(filename)
+    if cache is None:
+        return read_object(data, filename, verify)
+    key = cache.key(data, verify)
+    obj = cache.get(key)
+    if obj is None:
+        obj = read_object(data, filename, verify)
+        cache.put(key, obj)
+    elif isinstance(obj.get('modules'), LibraryModules):
+        # the same contents may have been cached under another file name
+        obj['modules'].data = data
+        obj['modules'].filename = filename
+        obj['modules'].verify = verify
+    return obj
+
+def map_file(filename):
+    with open(filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            error(f'empty file {filename}')
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+# load several files, with jobs worker processes parsing them in parallel;
+# the objects are returned in the order of filenames
+def load_objects(filenames, jobs=1, cache=None, verify=VERIFY_STRICT):
+    load = functools.partial(load_object, cache=cache, verify=verify)
+    if jobs <= 1 or len(filenames) <= 1:
+        return [load(filename) for filename in filenames]
+    # imported here, a sequential link does not pay for it
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(load, filenames))
+
+# identify file contents by hash and size
+def content_key(data):
+    return f'{hashlib.blake2b(data, digest_size=20).hexdigest()}-{len(data)}'
+
+def file_key(filename):
+    with map_file(filename) as data:
+        return content_key(data)
+
+def default_cache_directory():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'omf80')
+
+# version of the pickled modules and libraries, part of the cache keys:
+# bump it whenever their structure changes (Fields classes, tables, module
+# dicts) so that the entries written before are not read again
+CACHE_VERSION = 1
+
+# whether obj looks like a module or a library as read_object returns them
+def is_cached_object(obj):
+    if not isinstance(obj, dict):
+        return False
+    if obj.get('type') == 'MODULE':
+        return 'name' in obj and 'segments' in obj
+    if obj.get('type') == 'LIBRARY':
+        return 'modules' in obj and 'dictionary' in obj
+    return False
+
+# parsed modules and libraries, pickled on disk under the hash and the size
+# of the file they were parsed from; when the cache grows over max_size
+# bytes, the least recently used entries are removed
+class ObjectCache:
+
+    def __init__(self, directory=None, max_size=256 * 1024 * 1024):
+        self.directory = directory or default_cache_directory()
+        self.max_size = max_size
+
+    # a parse made without checking the checksums is not reused by a
+    # stricter one: the verify mode is part of the key
+    def key(self, data, verify=VERIFY_STRICT):
+        return f'{content_key(data)}-{verify}-v{CACHE_VERSION}'
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                obj = pickle.load(file)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # an unreadable entry is parsed and written again
+            return None
+        if not is_cached_object(obj):
+            return None
+        return obj
+
+    def put(self, key, obj):
+        path = self.path(key)
+        temp = f'{path}.{os.getpid()}'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp, 'wb') as file:
+                pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, path)
+            self.evict()
+        except OSError:
+            # the cache is an optimization only
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.pickle'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+
+# LIBRARY INDEX
+# The index of a library is a file next to it, <library>.idx, holding the
+# locations of its modules and its public names, sorted, with the module
+# defining each one: names are looked up by binary search, and a link reads
+# from the library only the modules it takes.  The index records the size
+# and the modification time of the library; it is rebuilt when they change.
+INDEX_MAGIC = b'OMF80IDX'
+# magic, library size, library mtime (ns), number of modules, number of names
+INDEX_HEADER = struct.Struct('<8sQQII')
+# module offsets follow, then the entries (offset of the name in the string
+# area, module index) sorted by name, then the names as (length, chars)
+U32 = struct.Struct('<I')
+INDEX_ENTRY = struct.Struct('<IH')
+
+def library_index_filename(filename):
+    return f'{filename}.idx'
+
+def library_index_to_bin(library, size, mtime_ns):
+    locations = library['modules'].locations
+    names = sorted((name.encode('ascii'), module)
+                    for name, module in library['dictionary'].items())
+    entries = bytearray()
+    strings = bytearray()
+    for name, module in names:
+        entries += INDEX_ENTRY.pack(len(strings), module)
+        strings.append(len(name))
+        strings += name
+    header = INDEX_HEADER.pack(INDEX_MAGIC, size, mtime_ns, len(locations), len(names))
+    return header + struct.pack(f'<{len(locations)}I', *locations) + entries + strings
+
+# the index of a library, read from data or from the mapped file filename;
+# it also serves as the dictionary of the library: name -> module index
+class LibraryIndex:
+
+    def __init__(self, data=None, filename=None):
+        if data is None:
+            data = map_file(filename)
+        self.data = data
+        self.filename = filename
+        self.magic = None
+        self.count = 0
+        self.locations = []
+        if len(data) < INDEX_HEADER.size:
+            return
+        self.magic, self.size, self.mtime_ns, modules, self.count = \
+                INDEX_HEADER.unpack_from(data, 0)
+        i = INDEX_HEADER.size
+        self.locations = list(struct.unpack_from(f'<{modules}I', data, i))
+        self.entries = i + U32.size * modules
+        self.strings = self.entries + INDEX_ENTRY.size * self.count
+
+    # whether the index was built from the library whose os.stat is stat
+    def is_current(self, stat):
+        return self.magic == INDEX_MAGIC and self.size == stat.st_size and \
+                self.mtime_ns == stat.st_mtime_ns
+
+    def entry(self, i):
+        offset, module = INDEX_ENTRY.unpack_from(self.data, self.entries + INDEX_ENTRY.size * i)
+        start = self.strings + offset
+        return self.data[start+1:start+1+self.data[start]], module
+
+    # position of name in the sorted entries, -1 if it is not there
+    def find(self, name):
+        key = name.encode('ascii')
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.entry(lo)[0] == key:
+            return lo
+        return -1
+
+    def get(self, name, default=None):
+        i = self.find(name)
+        if i < 0:
+            return default
+        return self.entry(i)[1]
+
+    # (module index, offset of the module in the library) defining name
+    def lookup(self, name):
+        module = self.get(name)
+        if module is None:
+            return None
+        return module, self.locations[module]
+
+    def __getitem__(self, name):
+        module = self.get(name)
+        if module is None:
+            raise KeyError(name)
+        return module
+
+    def __contains__(self, name):
+        return self.find(name) >= 0
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        for i in range(self.count):
+            name, module = self.entry(i)
+            yield str(name, 'ascii'), module
+
+    def keys(self):
+        for name, module in self.items():
+            yield name
+
+    __iter__ = keys
+
+    def __reduce__(self):
+        data = None if self.filename is not None else bytes(self.data)
+        return (LibraryIndex, (data, self.filename))
+
+# write the index of the library filename, return it
+def build_library_index(filename):
+    stat = os.stat(filename)
+    library = read_library(map_file(filename), filename)
+    if not isinstance(library['modules'], LibraryModules):
+        error(f'{filename}: library without module locations or dictionary')
+    index_filename = library_index_filename(filename)
+    temp = f'{index_filename}.{os.getpid()}'
+    with open(temp, 'wb') as file:
+        file.write(library_index_to_bin(library, stat.st_size, stat.st_mtime_ns))
+    os.replace(temp, index_filename)
+    return LibraryIndex(filename=index_filename)
+
+# the index of the library filename, rebuilt if it is missing or older than
+# the library
+def update_library_index(filename, force=False):
+    index_filename = library_index_filename(filename)
+    if not force and os.path.exists(index_filename) and \
+            os.path.getsize(index_filename) >= INDEX_HEADER.size:
+        index = LibraryIndex(filename=index_filename)
+        if index.is_current(os.stat(filename)):
+            return index
+    return build_library_index(filename)
+
+# the library filename read through its index; None if it has no index
+def load_indexed_library(filename, verify=VERIFY_STRICT):
+    if not os.path.exists(library_index_filename(filename)):
+        return None
+    try:
+        index = update_library_index(filename)
+    except OSError:
+        return None
+    return {'type': 'LIBRARY', 'dictionary': index,
+            'modules': LibraryModules(None, index.locations, filename, verify)}
+
+def public_names_of(module):
+    for seg_id, name, offset in public_symbols(module):
+        yield name
+
+# choose the modules to link: all the modules of lst, and the modules of its
+# libraries that define a missing public; return them with their sources,
+# (index in lst, index in the library or None)
+def select_modules(lst):
     modules = []
-    public_names = set()
-    extern_names = set()
-    for item in lst:
+    sources = []
+    symbols = GlobalSymbols()
+    for item_index, item in enumerate(lst):
         if item['type'] == 'MODULE':
-            module = item
-            ext = set(module['external_names'])
-            extern_names |= ext
-            pub = set(map(lambda x : x['name'], sum(module['public_declarations'].values(), [])))
-            public_names |= pub
-            extern_names -= public_names
-            modules.append(module)
+            symbols.add_module(item, len(modules))
+            modules.append(item)
+            sources.append((item_index, None))
         if item['type'] == 'LIBRARY':
             library = item
             dictionary = library['dictionary']
-            lib_names = set(dictionary.keys())
-            common_names = lib_names & extern_names
             indices = set()
-            for name in common_names:
-                index = dictionary[name]
-                indices.add(index)
+            for name in symbols.undefined:
+                index = dictionary.get(name)
+                if index is not None:
+                    indices.add(index)
             library_modules = library['modules']
             for index in indices:
                 module = library_modules[index]
-                ext = set(module.get('external_names', []))
-                extern_names |= ext
-                pub = set(map(lambda x : x['name'], sum(module['public_declarations'].values(), [])))
-                public_names |= pub
-                extern_names -= public_names
+                symbols.add_module(module, len(modules))
                 modules.append(module)
+                sources.append((item_index, index))
+
+    # the modules pulled from the libraries may need more modules, from the
+    # same library or an earlier one: take them from the first library
+    # defining each missing name until no library defines any of them
+    if len(symbols.undefined) > 0:
+        index = library_symbols(lst)
+        worklist = list(symbols.undefined)
+        for name in worklist:
+            source = index.get(name)
+            if source is None or name in symbols:
+                continue
+            item_index, module_index = source
+            module = lst[item_index]['modules'][module_index]
+            symbols.add_module(module, len(modules))
+            modules.append(module)
+            sources.append(source)
+            worklist.extend(name for name in module.get('external_names', ())
+                                if name not in symbols)
+    return modules, sources
+
+# the library modules defining each public name, (index in lst, index in
+# the library), from the first library that defines it
+def library_symbols(lst):
+    index = {}
+    for item_index, item in enumerate(lst):
+        if item['type'] == 'LIBRARY':
+            for name, module_index in item['dictionary'].items():
+                index.setdefault(name, (item_index, module_index))
+    return index
+
+# link modules and libraries; with gc, only the modules the main module
+# needs are linked
+def link(lst, gc=False):
+    modules, sources = select_modules(lst)
+    if gc:
+        modules, sources = gc_modules(modules, sources)
     return link_modules(modules)
 
+# the modules reachable from the main module through their external names,
+# each name leading to the module whose public links it; all the modules
+# are kept when none is a main module
+def gc_modules(modules, sources):
+    roots = [k for k, mod in enumerate(modules) if mod['is_main']]
+    if len(roots) == 0:
+        return modules, sources
+    symbols = GlobalSymbols()
+    for k, mod in enumerate(modules):
+        symbols.add_module(mod, k)
+    reachable = set(roots)
+    worklist = list(roots)
+    for k in worklist:
+        for name in modules[k].get('external_names', ()):
+            symbol = symbols.get(name)
+            if symbol is not None and symbol['module'] not in reachable:
+                reachable.add(symbol['module'])
+                worklist.append(symbol['module'])
+    kept = sorted(reachable)
+    return [modules[k] for k in kept], [sources[k] for k in kept]
+
+# INCREMENTAL LINK
+# The state of a link keeps, for each linked module, where it came from,
+# its part in the link (see link_parts) and what it must keep for that part
+# to be patched in place: its segment layout and its public and external
+# names.  When only such modules changed, they are relocated again at the
+# same place and the references to their publics are patched; the other
+# modules and the libraries are neither read nor relocated.
+LINK_STATE_VERSION = 2
+
+def module_signature(mod):
+    segments = [(seg_id, seg['seg_length'], seg['aln_typ'])
+                    for seg_id, seg in mod['segments'].items()]
+    externals = sorted(set(mod.get('external_names', [])))
+    publics = sorted((seg_id, pd['name'])
+                    for seg_id, pub_decl in mod.get('public_declarations', {}).items()
+                    for pd in pub_decl)
+    return (mod['is_main'], segments, externals, publics)
+
+def load_link_state(state_file):
+    try:
+        with open(state_file, 'rb') as file:
+            state = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        return None
+    if not isinstance(state, dict) or state.get('version') != LINK_STATE_VERSION:
+        return None
+    return state
+
+def save_link_state(state_file, state):
+    temp = f'{state_file}.{os.getpid()}'
+    with open(temp, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, state_file)
+
+# values of the publics of the parts of a link, as link_parts resolves them
+def part_publics(parts):
+    pub = {}
+    for part in parts:
+        for seg_id, name, offset in part['publics']:
+            pub[name] = (seg_id, offset)
+    return pub
+
+# link the files; with a state_file, reuse the previous link saved in it
+# when possible, and save the new one
+def link_files(filenames, state_file=None, jobs=1, cache=None, gc=False,
+                verify=VERIFY_STRICT):
+    if state_file is None:
+        return link(load_objects(filenames, jobs=jobs, cache=cache, verify=verify), gc=gc)
+    keys = [file_key(filename) for filename in filenames]
+    state = load_link_state(state_file)
+    module = None
+    if state is not None and state['gc'] == gc:
+        module = relink(filenames, keys, state, cache, verify)
+    if module is None:
+        lst = load_objects(filenames, jobs=jobs, cache=cache, verify=verify)
+        modules, sources = select_modules(lst)
+        if gc:
+            modules, sources = gc_modules(modules, sources)
+        bases = module_bases(modules)
+        parts = [relocate_module(mod, code_offset, data_offset)
+                    for mod, (code_offset, data_offset) in zip(modules, bases)]
+        module = link_parts(parts)
+        state = {'version': LINK_STATE_VERSION, 'gc': gc,
+                 'sources': sources, 'bases': bases,
+                 'signatures': [module_signature(mod) for mod in modules],
+                 'parts': parts}
+    state['keys'] = keys
+    save_link_state(state_file, state)
+    return module
+
+# redo the link saved in state with the files whose contents changed;
+# return None when the changes need a full link
+def relink(filenames, keys, state, cache=None, verify=VERIFY_STRICT):
+    if len(keys) != len(state['keys']):
+        return None
+    positions = {source: k for k, source in enumerate(state['sources'])}
+    parts = state['parts']
+    old_pub = part_publics(parts)
+    relocated = set()
+    for i, (key, old_key) in enumerate(zip(keys, state['keys'])):
+        if key == old_key:
+            continue
+        # only modules given as such can be replaced, not libraries
+        k = positions.get((i, None))
+        if k is None:
+            return None
+        mod = load_object(filenames[i], cache, verify)
+        if mod['type'] != 'MODULE' or module_signature(mod) != state['signatures'][k]:
+            return None
+        code_offset, data_offset = state['bases'][k]
+        parts[k] = relocate_module(mod, code_offset, data_offset)
+        relocated.add(k)
+    module = link_parts(parts)
+
+    # the other modules' references to publics that moved
+    new_pub = part_publics(parts)
+    moved = {name for name, value in new_pub.items() if old_pub.get(name) != value}
+    for k, part in enumerate(parts):
+        if k in relocated:
+            continue
+        for index, lhb, name, offsets in part['fixups']:
+            if name in moved:
+                old = old_pub[name][1]
+                new = new_pub[name][1]
+                if lhb == HIGH_BYTE:
+                    delta = (((new >> 8) - (old >> 8)) << 8) & 0xffff
+                else:
+                    delta = (new - old) & 0xffff
+                cdef = part['content_definitions'][index]
+                apply_fixups(cdef['data'], offsets, delta, lhb, cdef['offset'])
+    return module
+
 def add_eof(records):
-    rec_typ = END_OF_FILE_RECORD
-    eof_rec = {"rec_typ": rec_typ}
+    eof_rec = EndOfFileRecord()
     return records + [eof_rec]
 
 # EXAMPLE:
@@ -1161,35 +2378,364 @@ def module_adjust(module, code_start=0, stack_size=2):
         cdef_offset = cdef['offset']
         if cdef["seg_id"] == CODE_SEGMENT:
             for (seg_id, lhb), offsets in cdef.get('internal', {}).items():
-                for offset in offsets:
-                    if seg_id == CODE_SEGMENT:
-                        add16(data, offset-cdef_offset, code_start)
-                    elif seg_id == DATA_SEGMENT or seg_id == STACK_SEGMENT:
-                        add16(data, offset-cdef_offset, data_start)
-                    else:
-                        error("module adjust: unknown segment")
+                if len(offsets) == 0:
+                    continue
+                if seg_id == CODE_SEGMENT:
+                    apply_fixups(data, offsets, code_start, lhb, cdef_offset)
+                elif seg_id == DATA_SEGMENT or seg_id == STACK_SEGMENT:
+                    apply_fixups(data, offsets, data_start, lhb, cdef_offset)
+                else:
+                    error("module adjust: unknown segment")
     # do not adjust cdef['offset']: it represents the offset
     # from the beginning of the segment
 
-# insert arr2 into arr1 at offset
-# if needed, insert zeros
-# if needed, extend arr1
-def add_at(arr1, offset, arr2):
-    offs_end = offset + len(arr2)
-    if len(arr1) < offs_end:
-        arr1 += bytearray([0] * (offs_end - len(arr1)))
-    arr1[offset:offs_end] = arr2
-
-def module_to_bin(module):
-    code = bytearray()
-    stack = bytearray(module["segments"][STACK_SEGMENT]["seg_length"])
-    data = bytearray()
+# the binary image of a module is its code, its stack, then its data,
+# without the data when it has none; the code takes at least the length of
+# the code segment, so that the data is where module_adjust relocated it
+def image_layout(code_length, code_end, stack_size, data_end):
+    if data_end == 0:
+        return code_end, code_end
+    data_position = max(code_length, code_end) + stack_size
+    return data_position + data_end, data_position
+
+# (position in the image, data) of the code and data contents of a module,
+# in order; the later contents overwrite the earlier ones
+def module_contents(module):
+    segments = module["segments"]
+    code_length = segments[CODE_SEGMENT]["seg_length"] if CODE_SEGMENT in segments else 0
+    stack_size = segments[STACK_SEGMENT]["seg_length"] if STACK_SEGMENT in segments else 0
+    code_end = 0
+    data_end = 0
+    for cdef in module["content_definitions"]:
+        end = cdef["offset"] + len(cdef["data"])
+        if cdef["seg_id"] == CODE_SEGMENT:
+            code_end = max(code_end, end)
+        elif cdef["seg_id"] == DATA_SEGMENT:
+            data_end = max(data_end, end)
+    size, data_position = image_layout(code_length, code_end, stack_size, data_end)
+    contents = []
     for cdef in module["content_definitions"]:
         if cdef["seg_id"] == CODE_SEGMENT:
-            add_at(code, cdef["offset"], cdef["data"])
+            contents.append((cdef["offset"], cdef["data"]))
         elif cdef["seg_id"] == DATA_SEGMENT:
-            add_at(data, cdef["offset"], cdef["data"])
-    if len(data) == 0:
-        return code
+            contents.append((data_position + cdef["offset"], cdef["data"]))
+    return size, contents
+
+def module_to_bin(module):
+    size, contents = module_contents(module)
+    image = bytearray(size)
+    with memoryview(image) as view:
+        for position, data in contents:
+            view[position:position+len(data)] = data
+    return image
+
+# the image of a module loaded at start in Intel HEX format, with data
+# records for its contents only: the gaps between them are not filled
+HEX_RECORD_SIZE = 16
+
+def module_to_hex(module, start=0):
+    size, contents = module_contents(module)
+    if start + size > 0x10000:
+        error(f'image too large for Intel HEX: {start + size:#x} bytes')
+
+    # the spans of the image covered by contents, each built in one buffer
+    intervals = sorted((position, position + len(data)) for position, data in contents)
+    span_starts = []
+    spans = []
+    for begin, end in intervals:
+        if len(spans) > 0 and begin <= span_starts[-1] + len(spans[-1]):
+            span = spans[-1]
+            span.extend(bytes(max(0, end - span_starts[-1] - len(span))))
+        else:
+            span_starts.append(begin)
+            spans.append(bytearray(end - begin))
+    for position, data in contents:
+        i = bisect.bisect_right(span_starts, position) - 1
+        offset = position - span_starts[i]
+        spans[i][offset:offset+len(data)] = data
+
+    lines = []
+    for span_start, span in zip(span_starts, spans):
+        for i in range(0, len(span), HEX_RECORD_SIZE):
+            chunk = span[i:i+HEX_RECORD_SIZE]
+            record = bytearray([len(chunk)]) + U16_BE.pack(start + span_start + i) + b'\x00' + chunk
+            record.append(-sum(record) & 0xff)
+            lines.append(f':{record.hex().upper()}')
+    lines.append(':00000001FF')
+    return '\n'.join(lines) + '\n'
+
+# LINK TO BINARY
+# link_to_bin gives the same image as link, module_adjust and module_to_bin,
+# without building the linked module: a first pass places the modules and
+# their publics and measures the image, a second one copies the contents of
+# each module to its place in the image and patches it there.
+def link_to_bin(lst, code_start=0, stack_size=2, gc=False):
+    modules, sources = select_modules(lst)
+    if gc:
+        modules, sources = gc_modules(modules, sources)
+    bases = module_bases(modules)
+
+    # pass 1: the publics, the code length and the extent of the contents
+    symbols = GlobalSymbols()
+    code_length = 0
+    code_end = 0
+    data_end = 0
+    for k, (mod, (code_offset, data_offset)) in enumerate(zip(modules, bases)):
+        for seg_id, name, offset in public_symbols(mod):
+            symbols.define(name, k, seg_id,
+                    offset + segment_offset(seg_id, code_offset, data_offset))
+        code_length += mod['segments'][CODE_SEGMENT]['seg_length']
+        for cdef in mod['content_definitions']:
+            if cdef['seg_id'] == CODE_SEGMENT:
+                code_end = max(code_end, code_offset + cdef['offset'] + len(cdef['data']))
+            elif cdef['seg_id'] == DATA_SEGMENT:
+                data_end = max(data_end, data_offset + cdef['offset'] + len(cdef['data']))
+    data_start = code_start + code_length + stack_size
+    size, image_data = image_layout(code_length, code_end, stack_size, data_end)
+    image = bytearray(size)
+
+    # what module_adjust adds to the references from the code to a segment
+    def adjustment(seg_id):
+        if seg_id == CODE_SEGMENT:
+            return code_start
+        if seg_id == DATA_SEGMENT or seg_id == STACK_SEGMENT:
+            return data_start
+        error("module adjust: unknown segment")
+
+    # pass 2: the contents, relocated where they are in the image
+    with memoryview(image) as view:
+        for mod, (code_offset, data_offset) in zip(modules, bases):
+            for cdef in mod['content_definitions']:
+                seg_id = cdef['seg_id']
+                if seg_id == CODE_SEGMENT:
+                    start = code_offset + cdef['offset']
+                elif seg_id == DATA_SEGMENT:
+                    start = image_data + data_offset + cdef['offset']
+                else:
+                    continue
+                data = cdef['data']
+                cdef_offset = cdef['offset']
+                with view[start:start+len(data)] as dest:
+                    dest[:] = data
+                    for (target, lhb), offsets in cdef.get('internal', {}).items():
+                        value = segment_offset(target, code_offset, data_offset)
+                        adjust = adjustment(target) if seg_id == CODE_SEGMENT else 0
+                        apply_relocation(dest, offsets, value, adjust, lhb, cdef_offset)
+                    for lhb, exts in cdef.get('external', {}).items():
+                        references = {}
+                        for ext in exts:
+                            references.setdefault(ext['name'], []).append(ext['offset'])
+                        for name, offsets in references.items():
+                            symbol = symbols.get(name)
+                            if symbol is None:
+                                error(f'unresolved external {name}')
+                            adjust = 0
+                            if seg_id == CODE_SEGMENT and symbol['seg_id'] != ABSOLUTE_SEGMENT:
+                                adjust = adjustment(symbol['seg_id'])
+                            apply_relocation(dest, offsets, symbol['value'], adjust, lhb, cdef_offset)
+    return image
+
+# add value then adjust to the references at offsets; the high bytes of
+# the two are added one after the other, as link and module_adjust do
+def apply_relocation(data, offsets, value, adjust, lhb, base):
+    if lhb == HIGH_BYTE:
+        apply_fixups(data, offsets, value, lhb, base)
+        if adjust != 0:
+            apply_fixups(data, offsets, adjust, lhb, base)
     else:
-        return code + stack + data
+        apply_fixups(data, offsets, value + adjust, lhb, base)
+
+# SYMBOLIZER
+# Where the addresses of a linked module loaded at code_start come from:
+# the module, the nearest symbol (public or local) and the source line.
+# The address space of the 8080 is small enough to be indexed whole: one
+# table per kind of answer gives, for each of the 65536 addresses, the
+# entry covering it, so that a lookup is a few array accesses; formatted
+# answers are kept for the addresses already seen.
+# The modules are only known by their debug information: a module without
+# line numbers or local symbols in its code segment is taken as part of
+# the module before it.
+ADDRESS_SPACE = 0x10000
+
+class SourceLocation(Fields):
+    __slots__ = ("address", "module", "symbol", "offset", "line_number")
+
+    def __init__(self, address, module=None, symbol=None, offset=None, line_number=None):
+        self.address = address
+        self.module = module
+        self.symbol = symbol
+        self.offset = offset
+        self.line_number = line_number
+
+    def __str__(self):
+        module = self.module if self.module is not None else '?'
+        symbol = '?' if self.symbol is None else f'{self.symbol}+0x{self.offset:x}'
+        line = self.line_number if self.line_number is not None else '?'
+        return f'{self.address:04X}\t{module}\t{symbol}\t{line}'
+
+# for each address, the index of the last of the entries (address, index),
+# sorted by address, at or below it; -1 below the first entry
+def address_table(entries):
+    table = array('i', [-1]) * ADDRESS_SPACE
+    for (address, index), (next_address, next_index) in \
+            zip(entries, entries[1:] + [(ADDRESS_SPACE, None)]):
+        if next_address > address:
+            table[address:next_address] = array('i', [index]) * (next_address - address)
+    return table
+
+class Symbolizer:
+
+    def __init__(self, module, code_start=0, stack_size=2):
+        code_length = module['segments'][CODE_SEGMENT]['seg_length'] \
+                        if CODE_SEGMENT in module['segments'] else 0
+        data_start = code_start + code_length + stack_size
+        bases = {ABSOLUTE_SEGMENT: 0, CODE_SEGMENT: code_start,
+                 DATA_SEGMENT: data_start, STACK_SEGMENT: data_start, MEMORY_SEGMENT: 0}
+
+        def located(seg_id, table):
+            base = bases.get(seg_id, 0)
+            return [((offset + base) % ADDRESS_SPACE, value)
+                        for offset, value in zip(table.offsets, table.values)]
+
+        # modules, from their first line or local symbol in the code
+        self.modules = []
+        module_starts = []
+        # symbols: the publics over the locals at the same address
+        self.symbols = []
+        symbol_starts = []
+        for seg_id, table in module.get('public_declarations', {}).items():
+            for address, name in located(seg_id, table):
+                symbol_starts.append((address, 1, len(self.symbols)))
+                self.symbols.append((name, address))
+        # lines, with their module
+        self.lines = []
+        line_starts = []
+        for debug_info in module.get('debug_info', []):
+            index = len(self.modules)
+            self.modules.append(debug_info.get('ancestor_name'))
+            code_addresses = []
+            for seg_id, table in debug_info.get('local_symbols', {}).items():
+                for address, name in located(seg_id, table):
+                    symbol_starts.append((address, 0, len(self.symbols)))
+                    self.symbols.append((name, address))
+                    if seg_id == CODE_SEGMENT:
+                        code_addresses.append(address)
+            for seg_id, table in debug_info.get('line_numbers', {}).items():
+                for address, line_number in located(seg_id, table):
+                    line_starts.append((address, len(self.lines)))
+                    self.lines.append((line_number, index))
+                    if seg_id == CODE_SEGMENT:
+                        code_addresses.append(address)
+            if len(code_addresses) > 0:
+                module_starts.append((min(code_addresses), index))
+        module_starts.sort()
+        symbol_starts.sort()
+        line_starts.sort()
+        self.module_table = address_table(module_starts)
+        self.symbol_table = address_table([(address, index)
+                                            for address, public, index in symbol_starts])
+        self.line_table = address_table(line_starts)
+        self.formatted = {}
+
+    def lookup(self, address):
+        address %= ADDRESS_SPACE
+        location = SourceLocation(address)
+        module = self.module_table[address]
+        if module >= 0:
+            location.module = self.modules[module]
+        symbol = self.symbol_table[address]
+        if symbol >= 0:
+            location.symbol, symbol_address = self.symbols[symbol]
+            location.offset = address - symbol_address
+        line = self.line_table[address]
+        if line >= 0:
+            line_number, line_module = self.lines[line]
+            # the lines of a module do not cover the modules after it
+            if line_module == module:
+                location.line_number = line_number
+        return location
+
+    # the lookup of address as a line of text, computed once per address
+    def symbolize(self, address):
+        text = self.formatted.get(address)
+        if text is None:
+            text = str(self.lookup(address))
+            self.formatted[address] = text
+        return text
+
+    def symbolize_all(self, addresses):
+        return [self.symbolize(address) for address in addresses]
+
+# an address of a trace, in hexadecimal, with or without 0x or h
+def trace_address(word):
+    if word[-1] in 'hH':
+        word = word[0:-1]
+    return int(word, 16) % ADDRESS_SPACE
+
+# PROFILER
+# The samples of a trace are counted per address while it is read, so
+# that traces of any length take the same memory; the counts are then
+# attributed to symbols (functions) and source lines with a Symbolizer.
+class Profile:
+
+    def __init__(self, symbolizer):
+        self.symbolizer = symbolizer
+        self.counts = array('Q', bytes(8 * ADDRESS_SPACE))
+        self.total = 0
+
+    def add(self, address, count=1):
+        self.counts[address % ADDRESS_SPACE] += count
+        self.total += count
+
+    # count the first word of each line of a trace, converting each
+    # distinct word once; the lines are read in batches, so that a word
+    # that is not an address is found again in its batch for the line
+    # number of the ValueError
+    def add_trace(self, lines, batch_size=65536):
+        lines = iter(lines)
+        words = collections.Counter()
+        line_number = 1
+        while True:
+            batch = list(itertools.islice(lines, batch_size))
+            if len(batch) == 0:
+                break
+            known = len(words)
+            words.update(line.split(None, 1)[0] for line in batch if not line.isspace())
+            if len(words) > known:
+                for word in itertools.islice(words, known, None):
+                    try:
+                        trace_address(word)
+                    except ValueError:
+                        index = next(i for i, line in enumerate(batch)
+                                        if not line.isspace() and line.split(None, 1)[0] == word)
+                        raise ValueError(f'line {line_number + index}: not an address: {word}') from None
+            line_number += len(batch)
+        for word, count in words.items():
+            self.add(trace_address(word), count)
+
+    # the samples of the addresses grouped by key(location), most first
+    def group(self, key):
+        groups = collections.Counter()
+        for address, count in enumerate(self.counts):
+            if count > 0:
+                groups[key(self.symbolizer.lookup(address))] += count
+        return groups.most_common()
+
+    # ((module, function), samples)
+    def functions(self):
+        return self.group(lambda location: (location['module'], location['symbol']))
+
+    # ((module, line number), samples)
+    def lines(self):
+        return self.group(lambda location: (location['module'], location['line_number']))
+
+    # the lines of a collapsed stack file, module;function;line samples
+    def collapsed(self):
+        stacks = self.group(lambda location: (location['module'], location['symbol'],
+                                              location['line_number']))
+        stacks.sort(key=lambda stack: (stack[0][0] or '', stack[0][1] or '', stack[0][2] or 0))
+        for (module, symbol, line_number), count in stacks:
+            frames = [module or '?', symbol or '?']
+            if line_number is not None:
+                frames.append(f'line {line_number}')
+            yield f'{";".join(frames)} {count}'
@@ -1,25 +1,93 @@
 #!/usr/bin/env python
 
 import argparse
+import collections
+import json
+import sys
 
 import omf80
 
+# the fixups of a CONTENT record follow it and belong to its segment
+FIXUP_RECORDS = (omf80.RELOCATION_RECORD, omf80.INTERSEGMENT_REFERENCES_RECORD,
+                    omf80.EXTERNAL_REFERENCES_RECORD)
+
+def segment_records(records, segments):
+    content_seg_id = None
+    for record in records:
+        type = record["rec_typ"]
+        if type == omf80.CONTENT_RECORD:
+            content_seg_id = record["seg_id"]
+        if type in FIXUP_RECORDS:
+            seg_id = content_seg_id
+        else:
+            seg_id = record.get("seg_id")
+        if seg_id in segments:
+            yield record
+
+def print_summary(records):
+    counts = collections.Counter()
+    content = collections.Counter()
+    content_records = collections.Counter()
+    for record in records:
+        type = record["rec_typ"]
+        counts[type] += 1
+        if type == omf80.CONTENT_RECORD:
+            content[record["seg_id"]] += len(record["dat"])
+            content_records[record["seg_id"]] += 1
+    print("RECORDS")
+    for type, count in sorted(counts.items()):
+        print(f"\t{omf80.record_type_names.get(type, hex(type))} = {count}")
+    if len(content) > 0:
+        print("CONTENT")
+        for seg_id, length in sorted(content.items()):
+            print(f"\tSEG ID = {seg_id}, LENGTH = {length} in {content_records[seg_id]} records")
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("filename", help="path of the omf file")
+    parser.add_argument("--verify", choices=omf80.VERIFY_MODES, default=omf80.VERIFY_STRICT,
+                                help="check the record checksums one by one (strict), all at once (fast) or not at all (off)")
+    parser.add_argument("--format", choices=("text", "jsonl", "summary"), default="text",
+                                help="records as text, as one JSON object per line, or only their counts")
+    parser.add_argument("--type", action="append", dest="types", metavar="TYPE",
+                                help="only the records of this type, by name (CONTENT) or number (0x06); can be repeated")
+    parser.add_argument("--segment", type=int, action="append", dest="segments", metavar="SEG_ID",
+                                help="only the records of this segment, with the fixups of its content; can be repeated")
+    parser.add_argument("--no-data", action="store_true",
+                                help="leave out the bytes of the content records")
     args = parser.parse_args()
 
     filename = args.filename
+    types = None
+    if args.types is not None:
+        types = set()
+        for name in args.types:
+            type = omf80.record_type(name)
+            if type is None:
+                omf80.error(f'unknown record type {name}')
+            types.add(type)
+    segments = set(args.segments) if args.segments is not None else None
+    data = not args.no_data
 
-    file = open(filename, "rb")
-
-    data = file.read()
-
-    records = omf80.read_omf80(data)
-
-    for record in records:
-        print(omf80.record_to_string(record))
+    # through a memory map, --verify fast checks all the checksums at once;
+    # like load_object, the map is left to be closed when no longer used
+    contents = omf80.map_file(filename)
+    records = omf80.iter_records(contents, verify=args.verify)
+    if segments is not None:
+        records = segment_records(records, segments)
+    if types is not None:
+        records = (record for record in records if record["rec_typ"] in types)
+    if args.format == "summary":
+        print_summary(records)
+    elif args.format == "jsonl":
+        for record in records:
+            sys.stdout.write(json.dumps(omf80.record_to_json(record, data)) + '\n')
+    else:
+        for record in records:
+            print(omf80.record_to_string(record, data))
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+
+import omf80
+
+def read_int(str):
+    if str is None:
+        return 0
+    if str[-1].lower() == 'h':
+        return int(str[0:-1], 16)
+    elif len(str) > 1 and str[0:2] == '0x':
+        return int(str[2:], 16)
+    else:
+        return int(str, 10)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_in", help="linked omf module")
+    parser.add_argument("addresses", nargs="*",
+                                help="hexadecimal addresses; read from the input when none is given")
+    parser.add_argument("-i", "--input", help="file of addresses, the first word of each line (default: standard input)")
+    parser.add_argument("--code", help="start of the code segment")
+    parser.add_argument("--stack", help="size of the stack segment")
+    args = parser.parse_intermixed_args()
+
+    module = omf80.load_object(args.file_in)
+    symbolizer = omf80.Symbolizer(module, code_start=read_int(args.code),
+                                    stack_size=read_int(args.stack))
+
+    if len(args.addresses) > 0:
+        for address in args.addresses:
+            try:
+                print(symbolizer.symbolize(omf80.trace_address(address)))
+            except ValueError:
+                omf80.error(f'not an address: {address}')
+        return
+
+    # traces repeat the same addresses: each word is converted once
+    results = {}
+    out = []
+    file = open(args.input) if args.input is not None else sys.stdin
+    with file:
+        for line_number, line in enumerate(file, 1):
+            words = line.split(None, 1)
+            if len(words) == 0:
+                continue
+            result = results.get(words[0])
+            if result is None:
+                try:
+                    address = omf80.trace_address(words[0])
+                except ValueError:
+                    omf80.error(f'line {line_number}: not an address: {words[0]}')
+                result = symbolizer.symbolize(address)
+                results[words[0]] = result
+            out.append(result)
+            if len(out) >= 0x1000:
+                out.append('')
+                sys.stdout.write('\n'.join(out))
+                out.clear()
+    if len(out) > 0:
+        out.append('')
+        sys.stdout.write('\n'.join(out))
+
+if __name__ == "__main__":
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+
+import omf80
+
+def read_int(str):
+    if str is None:
+        return 0
+    if str[-1].lower() == 'h':
+        return int(str[0:-1], 16)
+    elif len(str) > 1 and str[0:2] == '0x':
+        return int(str[2:], 16)
+    else:
+        return int(str, 10)
+
+def print_table(title, rows, total, top):
+    print(title)
+    print(f'{"samples":>12} {"%":>6}  location')
+    for (module, what), count in rows[:top]:
+        module = module if module is not None else '?'
+        what = what if what is not None else '?'
+        print(f'{count:12} {100 * count / total:6.2f}  {module} {what}')
+    print()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_in", help="linked omf module")
+    parser.add_argument("trace", help="trace of the program counter, the first word of each line in hexadecimal ('-' for standard input)")
+    parser.add_argument("--code", help="start of the code segment")
+    parser.add_argument("--stack", help="size of the stack segment")
+    parser.add_argument("-n", "--top", type=int, default=20, help="number of entries in each report")
+    parser.add_argument("--collapsed", help="also write the samples to this file in collapsed stack format, for flame graphs")
+    args = parser.parse_args()
+
+    module = omf80.load_object(args.file_in)
+    symbolizer = omf80.Symbolizer(module, code_start=read_int(args.code),
+                                    stack_size=read_int(args.stack))
+    profile = omf80.Profile(symbolizer)
+    file = open(args.trace) if args.trace != '-' else sys.stdin
+    with file:
+        try:
+            profile.add_trace(file)
+        except ValueError as e:
+            omf80.error(e)
+    if profile.total == 0:
+        omf80.error('empty trace')
+
+    print(f'{profile.total} samples')
+    print()
+    print_table('FUNCTIONS', profile.functions(), profile.total, args.top)
+    print_table('LINES', [((module, f'line {line}' if line is not None else None), count)
+                            for (module, line), count in profile.lines()],
+                    profile.total, args.top)
+
+    if args.collapsed is not None:
+        with open(args.collapsed, 'w') as file:
+            for line in profile.collapsed():
+                print(line, file=file)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except omf80.OMFError as e:
+        omf80.error(e)